@@ -0,0 +1,500 @@
+#!/usr/bin/env python
+
+import numpy as np
+import itertools
+import argparse
+
+# A vectorized implementation of the 24 noiseless BBOB functions.
+# Each function takes a matrix X with the shape (n, dim) and returns a vector with the shape (n,).
+# The instance transformations (xopt, fopt, and rotations) are generated in the same manner as the legacy BBOB code in COCO (https://github.com/numbbo/coco/blob/master/code-experiments/src/suite_bbob_legacy_code.c).
+# For the large-scale BBOB function set ('bbob-largescale'), the rotations are replaced by the permuted block-diagonal rotations in the same manner as COCO (https://github.com/numbbo/coco/blob/master/code-experiments/src/large_scale_transformations.c).
+batch_fun_ids = {'bbob': list(range(1, 24+1)), 'bbob-largescale': list(range(1, 24+1))}
+
+coco_pi = 3.14159265358979323846
+
+def bbob2009_round(x):
+    return np.floor(x + 0.5)
+
+def bbob2009_unif(n, inseed):
+    if inseed < 0:
+        inseed = -inseed
+    if inseed < 1:
+        inseed = 1
+    aktseed = inseed
+    rgrand = [0] * 32
+    for i in range(39, -1, -1):
+        tmp = aktseed // 127773
+        aktseed = 16807 * (aktseed - tmp * 127773) - 2836 * tmp
+        if aktseed < 0:
+            aktseed = aktseed + 2147483647
+        if i < 32:
+            rgrand[i] = aktseed
+    aktrand = rgrand[0]
+
+    r = np.empty(n)
+    for i in range(n):
+        tmp = aktseed // 127773
+        aktseed = 16807 * (aktseed - tmp * 127773) - 2836 * tmp
+        if aktseed < 0:
+            aktseed = aktseed + 2147483647
+        tmp = aktrand // 67108865
+        aktrand = rgrand[tmp]
+        rgrand[tmp] = aktseed
+        r[i] = aktrand / 2.147483647e9
+        if r[i] == 0.:
+            r[i] = 1e-99
+    return r
+
+def bbob2009_gauss(n, seed):
+    uniftmp = bbob2009_unif(2 * n, seed)
+    g = np.sqrt(-2 * np.log(uniftmp[:n])) * np.cos(2 * coco_pi * uniftmp[n:])
+    g[g == 0.] = 1e-99
+    return g
+
+# Gram-Schmidt orthonormalization of the columns
+def orthonormalize_columns(B):
+    for i in range(B.shape[1]):
+        for j in range(i):
+            prod = np.dot(B[:, i], B[:, j])
+            B[:, i] -= prod * B[:, j]
+        B[:, i] /= np.sqrt(np.dot(B[:, i], B[:, i]))
+    return B
+
+def bbob2009_compute_rotation(seed, dim):
+    gvect = bbob2009_gauss(dim * dim, seed)
+    # B[i][j] = gvect[j * dim + i]
+    B = gvect.reshape(dim, dim).T.copy()
+    return orthonormalize_columns(B)
+
+# Return a function that rotates each row of X, i.e., X @ B.T
+def bbob2009_rotation(seed, dim):
+    B = bbob2009_compute_rotation(seed, dim)
+    return lambda X: X @ B.T
+
+def bbob2009_compute_xopt(seed, dim):
+    xopt = bbob2009_unif(dim, seed)
+    xopt = 8 * np.floor(1e4 * xopt) / 1e4 - 4
+    xopt[xopt == 0.0] = -1e-5
+    return xopt
+
+def bbob2009_compute_fopt(fun_id, instance_id):
+    rseed = fun_id
+    if fun_id == 4:
+        rseed = 3
+    elif fun_id == 18:
+        rseed = 17
+    rrseed = rseed + 10000 * instance_id
+    gval = bbob2009_gauss(1, rrseed)[0]
+    gval2 = bbob2009_gauss(1, rrseed + 1)[0]
+    return min(1000., max(-1000., bbob2009_round(100. * 100. * gval / gval2) / 100.))
+
+### Permuted block-diagonal rotations for the large-scale BBOB function set
+# The random number generator in COCO (coco_random.c), which is a lagged Fibonacci generator with the lags 607 and 273.
+# This generator yields the uniform random numbers one by one.
+def coco_random_uniform(seed):
+    long_lag, short_lag = 607, 273
+    state = np.empty(long_lag)
+    seed = seed & 0xffffffff
+    # Expand the seed to fill the initial state
+    for i in range(long_lag):
+        state[i] = seed / 4294967295.
+        seed = (1812433253 * (seed ^ (seed >> 30)) + i + 1) & 0xffffffff
+    while True:
+        yield from state.tolist()
+        # x[i] = (x[i - 607] + x[i - 273]) mod 1, where x[i - 273] can be updated in the same step
+        for start, end in [(0, short_lag), (short_lag, 2 * short_lag), (2 * short_lag, long_lag)]:
+            if start < short_lag:
+                t = state[start:end] + state[start + long_lag - short_lag:end + long_lag - short_lag]
+            else:
+                t = state[start:end] + state[start - short_lag:end - short_lag]
+            state[start:end] = np.where(t >= 1., t - 1., t)
+
+def coco_random_normal(rng, n):
+    u = np.fromiter(itertools.islice(rng, 2 * n), float, 2 * n)
+    return np.sqrt(-2 * np.log(u[::2])) * np.cos(2 * coco_pi * u[1::2])
+
+def ls_compute_block_sizes(dim, max_block_size=40):
+    block_size = min(dim, max_block_size)
+    n_blocks = (dim + block_size - 1) // block_size
+    return [block_size] * (n_blocks - 1) + [dim - block_size * (n_blocks - 1)]
+
+# Return the list of the diagonal blocks of the block-diagonal rotation matrix
+def ls_compute_blockrotation(seed, dim):
+    rng = coco_random_uniform(seed)
+    blocks = []
+    for block_size in ls_compute_block_sizes(dim):
+        # B[i][j] is the (i * block_size + j)-th normal random number
+        B = coco_random_normal(rng, block_size * block_size).reshape(block_size, block_size)
+        blocks.append(orthonormalize_columns(B))
+    return blocks
+
+# Return a permutation generated by "nb_swaps" swaps of the variables within the distance "swap_range", where the variables are visited in a random order
+def ls_compute_truncated_uniform_swap_permutation(seed, n, nb_swaps, swap_range):
+    rng = coco_random_uniform(seed)
+    random_data = np.fromiter(itertools.islice(rng, n), float, n)
+    idx_order = np.argsort(random_data, kind='stable')
+    P = np.arange(n)
+    for idx_swap in range(nb_swaps):
+        first_swap_var = idx_order[idx_swap]
+        lower_bound = max(first_swap_var - swap_range, 0)
+        upper_bound = min(first_swap_var + swap_range, n - 1)
+        second_swap_var = first_swap_var
+        while second_swap_var == first_swap_var:
+            second_swap_var = int(next(rng) * (upper_bound - lower_bound + 1)) + lower_bound
+        P[first_swap_var], P[second_swap_var] = P[second_swap_var], P[first_swap_var]
+    return P
+
+# Return a function that transforms each row x of X to P1 B P2 x, where B is a block-diagonal rotation matrix, and P1 and P2 are permutation matrices.
+# The permutation P maps x to (x[P[0]], ..., x[P[dim-1]]).
+def ls_rotation(seed, dim, left_perm_seed, right_perm_seed):
+    blocks = ls_compute_blockrotation(seed, dim)
+    nb_swaps, swap_range = dim, dim // 3
+    P1 = ls_compute_truncated_uniform_swap_permutation(left_perm_seed, dim, nb_swaps, swap_range)
+    P2 = ls_compute_truncated_uniform_swap_permutation(right_perm_seed, dim, nb_swaps, swap_range)
+    def rotate(X):
+        Y = X[:, P2]
+        Z = np.empty_like(Y)
+        start = 0
+        for B in blocks:
+            end = start + len(B)
+            Z[:, start:end] = Y[:, start:end] @ B.T
+            start = end
+        return Z[:, P1]
+    return rotate
+
+### Transformations in the search space and the objective space
+def exponents(dim):
+    return np.arange(dim) / (dim - 1.)
+
+def lambda_diag(alpha, dim):
+    return np.power(np.sqrt(alpha), exponents(dim))
+
+def tosz(x):
+    y = np.zeros_like(x)
+    pos = x > 0
+    neg = x < 0
+    tmp = np.log(x[pos]) / 0.1
+    y[pos] = np.power(np.exp(tmp + 0.49 * (np.sin(tmp) + np.sin(0.79 * tmp))), 0.1)
+    tmp = np.log(-x[neg]) / 0.1
+    y[neg] = -np.power(np.exp(tmp + 0.49 * (np.sin(0.55 * tmp) + np.sin(0.31 * tmp))), 0.1)
+    return y
+
+def tasy(x, beta):
+    y = x.copy()
+    e = np.broadcast_to(beta * exponents(x.shape[1]), x.shape)
+    pos = x > 0
+    y[pos] = np.power(x[pos], 1. + e[pos] * np.sqrt(x[pos]))
+    return y
+
+def penalty(X, bound=5.):
+    tmp = np.maximum(np.abs(X) - bound, 0.)
+    return np.sum(tmp * tmp, axis=1)
+
+### Raw functions
+def raw_sphere(Z):
+    return np.sum(Z * Z, axis=1)
+
+def raw_ellipsoid(Z):
+    return (np.power(1e6, exponents(Z.shape[1])) * Z * Z).sum(axis=1)
+
+def raw_rastrigin(Z):
+    return 10. * (Z.shape[1] - np.sum(np.cos(2 * coco_pi * Z), axis=1)) + np.sum(Z * Z, axis=1)
+
+def raw_rosenbrock(Z):
+    c1 = Z[:, :-1] * Z[:, :-1] - Z[:, 1:]
+    c2 = Z[:, :-1] - 1.
+    return 100. * np.sum(c1 * c1, axis=1) + np.sum(c2 * c2, axis=1)
+
+# In the large-scale BBOB function set, the first ceil(dim / 40) variables play the role of the first variable in the following three functions
+def raw_discus(Z, n_axes=1):
+    return 1e6 * np.sum(Z[:, :n_axes] * Z[:, :n_axes], axis=1) + np.sum(Z[:, n_axes:] * Z[:, n_axes:], axis=1)
+
+def raw_bent_cigar(Z, n_axes=1):
+    return np.sum(Z[:, :n_axes] * Z[:, :n_axes], axis=1) + 1e6 * np.sum(Z[:, n_axes:] * Z[:, n_axes:], axis=1)
+
+def raw_sharp_ridge(Z, n_axes=1):
+    return np.sum(Z[:, :n_axes] * Z[:, :n_axes], axis=1) + 100. * np.sqrt(np.sum(Z[:, n_axes:] * Z[:, n_axes:], axis=1))
+
+def raw_different_powers(Z):
+    return np.sqrt(np.sum(np.power(np.abs(Z), 2. + 4. * exponents(Z.shape[1])), axis=1))
+
+def raw_weierstrass(Z):
+    ak = np.power(0.5, np.arange(12))
+    bk = np.power(3., np.arange(12))
+    f0 = np.sum(ak * np.cos(coco_pi * bk))
+    res = np.zeros(len(Z))
+    for a, b in zip(ak, bk):
+        res += np.sum(np.cos(2 * coco_pi * (Z + 0.5) * b), axis=1) * a
+    return 10. * np.power(res / Z.shape[1] - f0, 3.)
+
+def raw_schaffers(Z):
+    tmp = Z[:, :-1] * Z[:, :-1] + Z[:, 1:] * Z[:, 1:]
+    res = np.sum(np.power(tmp, 0.25) * (1. + np.power(np.sin(50. * np.power(tmp, 0.1)), 2.)), axis=1)
+    return np.power(res / (Z.shape[1] - 1.), 2.)
+
+def raw_griewank_rosenbrock(Z):
+    c1 = Z[:, :-1] * Z[:, :-1] - Z[:, 1:]
+    c2 = 1. - Z[:, :-1]
+    tmp = 100. * c1 * c1 + c2 * c2
+    return 10. + 10. * np.sum(tmp / 4000. - np.cos(tmp), axis=1) / (Z.shape[1] - 1.)
+
+def raw_schwefel(Z):
+    tmp = np.maximum(np.abs(Z) - 500., 0.)
+    pen = np.sum(tmp * tmp, axis=1)
+    s = np.sum(Z * np.sin(np.sqrt(np.abs(Z))), axis=1)
+    return 0.01 * (pen + 418.9828872724339 - s / Z.shape[1])
+
+def raw_katsuura(Z):
+    dim = Z.shape[1]
+    tmp = np.zeros_like(Z)
+    for j in range(1, 33):
+        tmp2 = 2. ** j
+        tmp += np.abs(tmp2 * Z - bbob2009_round(tmp2 * Z)) / tmp2
+    tmp = 1. + (np.arange(dim) + 1.) * tmp
+    res = np.prod(np.power(tmp, 10. / np.power(dim, 1.2)), axis=1)
+    return 10. / dim / dim * (-1. + res)
+
+### Instances
+# "rotation" is a function returned by bbob2009_rotation or ls_rotation
+def create_gallagher(dim, rseed, fopt, n_peaks, rotation):
+    maxcondition = 1000.
+    maxcondition1 = 1000.
+    fitvalues = [1.1, 9.1]
+    if n_peaks == 101:
+        maxcondition1 = np.sqrt(maxcondition1)
+        b, c = 10., 5.
+    else:
+        b, c = 9.8, 4.9
+
+    random_numbers = bbob2009_unif(n_peaks - 1, rseed)
+    rperm = np.argsort(random_numbers, kind='stable')
+    arr_condition = np.empty(n_peaks)
+    peak_values = np.empty(n_peaks)
+    arr_condition[0] = maxcondition1
+    peak_values[0] = 10.
+    for i in range(1, n_peaks):
+        arr_condition[i] = np.power(maxcondition, rperm[i - 1] / (n_peaks - 2.))
+        peak_values[i] = (i - 1.) / (n_peaks - 2.) * (fitvalues[1] - fitvalues[0]) + fitvalues[0]
+
+    arr_scales = np.empty((n_peaks, dim))
+    for i in range(n_peaks):
+        rperm = np.argsort(bbob2009_unif(dim, rseed + 1000 * i), kind='stable')
+        arr_scales[i] = np.power(arr_condition[i], rperm / (dim - 1.) - 0.5)
+
+    random_numbers = bbob2009_unif(dim * n_peaks, rseed).reshape(n_peaks, dim)
+    # x_local[j] is the j-th peak in the rotated space
+    x_local = rotation(b * random_numbers - c)
+    x_local[0] *= 0.8
+
+    def fun(X):
+        Y = rotation(X)
+        f = np.zeros(len(X))
+        for i in range(n_peaks):
+            tmp = Y - x_local[i]
+            f = np.maximum(f, peak_values[i] * np.exp(-0.5 / dim * np.sum(arr_scales[i] * tmp * tmp, axis=1)))
+        f = 10. - f
+        ftrue = f.copy()
+        pos = f > 0
+        neg = f < 0
+        tmp = np.log(f[pos]) / 0.1
+        ftrue[pos] = np.power(np.exp(tmp + 0.49 * (np.sin(tmp) + np.sin(0.79 * tmp))), 0.1)
+        tmp = np.log(-f[neg]) / 0.1
+        ftrue[neg] = -np.power(np.exp(tmp + 0.49 * (np.sin(0.55 * tmp) + np.sin(0.31 * tmp))), 0.1)
+        return ftrue * ftrue + penalty(X) + fopt
+    return fun
+
+def create_bbob_fun(fun_id, instance_id, dim, bbob_suite='bbob'):
+    rseed = fun_id + 10000 * instance_id
+    if fun_id == 4:
+        rseed = 3 + 10000 * instance_id
+    elif fun_id == 18:
+        rseed = 17 + 10000 * instance_id
+    fopt = bbob2009_compute_fopt(fun_id, instance_id)
+
+    # The seeds of the two permutations are only used for the large-scale BBOB function set
+    def rotation(seed, left_perm_seed, right_perm_seed):
+        if bbob_suite == 'bbob-largescale':
+            return ls_rotation(seed, dim, left_perm_seed, right_perm_seed)
+        return bbob2009_rotation(seed, dim)
+
+    n_axes = 1
+    if bbob_suite == 'bbob-largescale':
+        n_axes = (dim + 39) // 40
+
+    if fun_id in [6, 7, 10, 11, 12, 13, 14, 15, 16, 17, 18, 23, 24]:
+        R = rotation(rseed + 1000000, rseed + 2000000, rseed + 3000000)
+        Q = rotation(rseed, rseed + 4000000, rseed + 5000000)
+
+    if fun_id == 1:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_sphere(X - xopt) + fopt
+    elif fun_id == 2:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_ellipsoid(tosz(X - xopt)) + fopt
+    elif fun_id == 3:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_rastrigin(lambda_diag(10., dim) * tasy(tosz(X - xopt), 0.2)) + fopt
+    elif fun_id == 4:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        xopt[::2] = np.abs(xopt[::2])
+        def fun(X):
+            Z = tosz(X - xopt)
+            factor = np.broadcast_to(lambda_diag(10., dim), Z.shape).copy()
+            factor[:, ::2][Z[:, ::2] > 0] *= 10.
+            return raw_rastrigin(factor * Z) + fopt + 100. * penalty(X)
+        return fun
+    elif fun_id == 5:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        xopt = np.where(xopt < 0., -5., 5.)
+        s = np.sign(xopt) * np.power(np.sqrt(100.), exponents(dim))
+        def fun(X):
+            Z = np.where(X * xopt < 25., X, xopt)
+            return np.sum(5. * np.abs(s) - s * Z, axis=1) + fopt
+        return fun
+    elif fun_id == 6:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        def fun(X):
+            Z = R(Q(X - xopt) * lambda_diag(10., dim))
+            f = np.sum(np.where(Z * xopt > 0., 100. * 100., 1.) * Z * Z, axis=1)
+            return np.power(tosz(f), 0.9) + fopt
+        return fun
+    elif fun_id == 7:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        def fun(X):
+            Z_hat = Q(X - xopt) * lambda_diag(10., dim)
+            Z_tilde = np.where(np.abs(Z_hat) > 0.5, bbob2009_round(Z_hat), bbob2009_round(10. * Z_hat) / 10.)
+            Z = R(Z_tilde)
+            f = np.sum(np.power(100., exponents(dim)) * Z * Z, axis=1)
+            return 0.1 * np.maximum(np.abs(Z_hat[:, 0]) / 1e4, f) + penalty(X) + fopt
+        return fun
+    elif fun_id == 8:
+        xopt = 0.75 * bbob2009_compute_xopt(rseed, dim)
+        factor = max(1., np.sqrt(dim) / 8.)
+        return lambda X: raw_rosenbrock(factor * (X - xopt) + 1.) + fopt
+    elif fun_id == 9:
+        factor = max(1., np.sqrt(dim) / 8.)
+        rot = rotation(rseed, rseed + 1000000, rseed + 2000000)
+        return lambda X: raw_rosenbrock(factor * rot(X) + 0.5) + fopt
+    elif fun_id == 10:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_ellipsoid(tosz(R(X - xopt))) + fopt
+    elif fun_id == 11:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_discus(tosz(R(X - xopt)), n_axes) + fopt
+    elif fun_id == 12:
+        xopt = bbob2009_compute_xopt(rseed + 1000000, dim)
+        return lambda X: raw_bent_cigar(R(tasy(R(X - xopt), 0.5)), n_axes) + fopt
+    elif fun_id == 13:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_sharp_ridge(R(Q(X - xopt) * lambda_diag(10., dim)), n_axes) + fopt
+    elif fun_id == 14:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_different_powers(R(X - xopt)) + fopt
+    elif fun_id == 15:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_rastrigin(R(Q(tasy(tosz(R(X - xopt)), 0.2)) * lambda_diag(10., dim))) + fopt
+    elif fun_id == 16:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_weierstrass(R(Q(tosz(R(X - xopt))) * lambda_diag(0.01, dim))) + fopt + 10. / dim * penalty(X)
+    elif fun_id in [17, 18]:
+        conditioning = 10.
+        if fun_id == 18:
+            conditioning = 1000.
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_schaffers(Q(tasy(R(X - xopt), 0.5)) * lambda_diag(conditioning, dim)) + fopt + 10. * penalty(X)
+    elif fun_id == 19:
+        factor = max(1., np.sqrt(dim) / 8.)
+        rot = rotation(rseed, rseed + 1000000, rseed + 2000000)
+        return lambda X: raw_griewank_rosenbrock(factor * rot(X) + 0.5) + fopt
+    elif fun_id == 20:
+        tmp = bbob2009_unif(dim, rseed)
+        xopt = np.where(tmp - 0.5 < 0, -0.5 * 4.2096874637, 0.5 * 4.2096874637)
+        def fun(X):
+            X_hat = 2. * np.where(tmp < 0.5, -X, X)
+            Z_hat = X_hat.copy()
+            Z_hat[:, 1:] += 0.25 * (X_hat[:, :-1] - 2. * np.abs(xopt[:-1]))
+            Z = 100. * (lambda_diag(10., dim) * (Z_hat - 2. * np.abs(xopt)) + 2. * np.abs(xopt))
+            return raw_schwefel(Z) + fopt
+        return fun
+    elif fun_id == 21:
+        return create_gallagher(dim, rseed, fopt, 101, rotation(rseed, rseed + 1000000, rseed + 2000000))
+    elif fun_id == 22:
+        return create_gallagher(dim, rseed, fopt, 21, rotation(rseed, rseed + 1000000, rseed + 2000000))
+    elif fun_id == 23:
+        xopt = bbob2009_compute_xopt(rseed, dim)
+        return lambda X: raw_katsuura(R(Q(X - xopt) * lambda_diag(100., dim))) + fopt + penalty(X)
+    elif fun_id == 24:
+        mu0 = 2.5
+        d = 1.
+        s = 1. - 0.5 / (np.sqrt(dim + 20.) - 4.1)
+        mu1 = -np.sqrt((mu0 * mu0 - d) / s)
+        xopt = np.where(bbob2009_gauss(dim, rseed) < 0., -0.5 * mu0, 0.5 * mu0)
+        def fun(X):
+            X_hat = np.where(xopt < 0., -2. * X, 2. * X)
+            Z = R(Q(X_hat - mu0) * lambda_diag(100., dim))
+            sum1 = np.sum((X_hat - mu0) ** 2, axis=1)
+            sum2 = np.sum((X_hat - mu1) ** 2, axis=1)
+            sum3 = np.sum(np.cos(2 * coco_pi * Z), axis=1)
+            return np.minimum(sum1, d * dim + s * sum2) + 10. * (dim - sum3) + 1e4 * penalty(X) + fopt
+        return fun
+
+    error_msg = "Error: f{} is not defined.".format(fun_id)
+    raise Exception(error_msg)
+
+# Return a vectorized version of a cocoex problem, or None if it is not available
+def create_batch_fun(problem):
+    bbob_suite = problem.id.split('_f')[0]
+    fun_id = int(problem.id.split('_f')[1].split('_')[0])
+    # Unlike "count_instance_id" in sample.py, this is the actual instance ID, which determines the random seed
+    instance_id = int(problem.id.split('_i')[1].split('_')[0])
+    if fun_id not in batch_fun_ids.get(bbob_suite, []):
+        return None
+    return create_bbob_fun(fun_id, instance_id, problem.dimension, bbob_suite)
+
+# Evaluate the sample X by the vectorized function and check the result with the original problem at "n_checks" evenly spaced points.
+# If they do not match, or if the vectorized function is not available, the sample is evaluated by the original problem one by one.
+# "batch_fun" can be given to reuse the vectorized function created by create_batch_fun, e.g., for the chunks of a sample.
+def evaluate_sample(problem, sample, n_checks=10, rtol=1e-8, atol=1e-8, batch_fun=None):
+    if batch_fun is None:
+        batch_fun = create_batch_fun(problem)
+    if batch_fun is not None:
+        obj_values = batch_fun(sample)
+        # The points are selected without the random number generator so that the sampling is not affected
+        check_ids = np.unique(np.linspace(0, len(sample) - 1, n_checks).astype(int))
+        cocoex_values = np.array([problem(sample[i]) for i in check_ids])
+        if np.allclose(obj_values[check_ids], cocoex_values, rtol=rtol, atol=atol):
+            return obj_values
+        print("Warning. The vectorized function does not match {}, so the sample is evaluated one by one".format(problem.id))
+
+    obj_values = []
+    for x in sample:
+        obj_values.append(problem(x))
+    return np.array(obj_values)
+
+# Compare the vectorized functions with the cocoex problems
+def check_parity(bbob_suite, dims, sample_size=1000, rtol=1e-8, atol=1e-8):
+    import cocoex
+    suite = cocoex.Suite(bbob_suite, "", "dimensions: {}".format(','.join([str(d) for d in dims])))
+    n_failures = 0
+    for problem in suite:
+        batch_fun = create_batch_fun(problem)
+        if batch_fun is None:
+            continue
+        X = np.random.uniform(-5.5, 5.5, size=(sample_size, problem.dimension))
+        batch_values = batch_fun(X)
+        cocoex_values = np.array([problem(x) for x in X])
+        max_error = np.max(np.abs(batch_values - cocoex_values) / np.maximum(np.abs(cocoex_values), 1.))
+        if not np.allclose(batch_values, cocoex_values, rtol=rtol, atol=atol):
+            n_failures += 1
+            print("Mismatch: {}, max. relative error={}".format(problem.id, max_error))
+    print("{}: {} mismatched problems".format(bbob_suite, n_failures))
+    return n_failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the vectorized BBOB functions with cocoex')
+    parser.add_argument('--sample_size', type=int, default=1000)
+    args = parser.parse_args()
+
+    check_parity('bbob', [2, 3, 5, 10], sample_size=args.sample_size)
+    # 80 and 160 have more than one block in the block-diagonal rotations
+    check_parity('bbob-largescale', [20, 40, 80, 160], sample_size=args.sample_size)
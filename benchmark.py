@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+import numpy as np
+import pandas as pd
+import argparse
+import multiprocessing
+import subprocess
+import platform
+import resource
+import time
+import json
+import os
+from sample_store import get_sample_data_file_path, save_sample
+from feature_computation import pca_solvers, get_dim_redu, get_bbob_suite, get_feature_file_path, compute_features
+from feature_aggregation import read_feature_columns, add_labels, save_table
+from native_features import native_feature_classes
+from pipeline_cache import library_versions
+
+# Benchmark the stages of the pipeline (sample -> feature -> table -> classify) on a subset of the dimensions, functions, instances, and sample multipliers.
+# Each measurement is performed in a fresh process so that its peak memory usage (the maximum resident set size) is not affected by the other measurements.
+stages = ['sample', 'feature', 'table', 'classify']
+result_columns = ['stage', 'feature_class', 'backend', 'dim', 'fun', 'instance', 'multiplier', 'sample_size', 'repeat', 'wall_time', 'cpu_time', 'peak_rss_mb', 'rss_increase_mb']
+
+def bench_sample(bbob_suite, fun_id, dim, instance_id, sample_size, sample_data_file_path, chunk_size=None):
+    import cocoex
+    from sample import create_sample, create_sample_chunked
+    # "instance_indices" selects the instance by its index in the suite, which is the same as the instance ID in this project (see the note in README.md)
+    suite = cocoex.Suite(bbob_suite, "", "function_indices: {} dimensions: {} instance_indices: {}".format(fun_id, dim, instance_id))
+    problem = next(iter(suite))
+    if chunk_size is None:
+        sample, obj_values = create_sample(problem, 'lhs', sample_size)
+        save_sample(sample_data_file_path, sample, obj_values)
+    else:
+        create_sample_chunked(problem, 'lhs', sample_size, sample_data_file_path, chunk_size)
+    problem.free()
+
+def bench_feature(ela_feature_class, sample_data_file_path, feature_file_path, n_pca_components=2, pca_solver='full', native_classes=[]):
+    compute_features(ela_feature_class, sample_data_file_path, feature_file_path, get_dim_redu(ela_feature_class), n_pca_components, pca_solver, native_classes)
+
+def bench_table(table_file_path, feature_dir_path, feature_classes, dims, fun_ids, instance_ids):
+    table_df = read_feature_columns(feature_dir_path, feature_classes, dims, 1, fun_ids, instance_ids)
+    table_df = add_labels(table_df)
+    save_table(table_df, table_file_path)
+
+def bench_classify(table_file_path, dim, left_fun_id, target_label):
+    from property_classification import clean_table, lopo_cv_fold
+    table_df = pd.read_csv(table_file_path, header=0)
+    table_df = clean_table(table_df, dim)
+    lopo_cv_fold(table_df, left_fun_id, target_label)
+
+def run_measurement(bench_fun, args):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_wall_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    bench_fun(*args)
+    wall_time = time.perf_counter() - start_wall_time
+    cpu_time = time.process_time() - start_cpu_time
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return wall_time, cpu_time, peak_rss / 1024, (peak_rss - rss_before) / 1024
+
+# Run "bench_fun" in a new process and return the wall time, the CPU time, the peak RSS, and the increase in the peak RSS during the call
+def measure(bench_fun, args):
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(processes=1) as pool:
+        return pool.apply(run_measurement, (bench_fun, args))
+
+def run_benchmark(work_dir_path, run_stages, feature_classes, dims, fun_ids, instance_ids, sample_multipliers, n_repeats=1, n_pca_components=2, pca_solver='full', native_classes=[], chunk_size=None, sample_root_path=None):
+    if sample_root_path is None:
+        sample_root_path = os.path.join(work_dir_path, 'sample_data')
+
+    results = []
+    def add_result(stage, ela_feature_class, backend, dim, fun_id, instance_id, multiplier, sample_size, repeat, measurement):
+        results.append((stage, ela_feature_class, backend, dim, fun_id, instance_id, multiplier, sample_size, repeat) + tuple(measurement))
+        print("{}: class={}, backend={}, dimension={}, f={}, instance ID={}, n={}: wall time={:.2f}s, CPU time={:.2f}s, peak RSS={:.0f}MB (+{:.0f}MB)".format(stage, ela_feature_class, backend, dim, fun_id, instance_id, sample_size, *measurement))
+
+    for multiplier in sample_multipliers:
+        sample_dir_path = os.path.join(sample_root_path, 'lhs_multiplier{}_sid0'.format(multiplier))
+        feature_dir_path = os.path.join(work_dir_path, 'ela_feature_dataset', 'lhs_multiplier{}_sid0'.format(multiplier))
+        table_file_path = os.path.join(work_dir_path, 'feature_table_data', 'lhs_multiplier{}_sid0.csv'.format(multiplier))
+        for dir_path in [sample_dir_path, feature_dir_path, os.path.dirname(table_file_path)]:
+            os.makedirs(dir_path, exist_ok=True)
+
+        for dim in dims:
+            bbob_suite = get_bbob_suite(dim)
+            sample_size = multiplier * dim
+            for fun_id in fun_ids:
+                for instance_id in instance_ids:
+                    sample_data_file_path = get_sample_data_file_path(sample_dir_path, bbob_suite, fun_id, dim, instance_id)
+                    for repeat in range(n_repeats):
+                        if 'sample' in run_stages:
+                            backend = 'batch' if chunk_size is None else 'chunked'
+                            add_result('sample', None, backend, dim, fun_id, instance_id, multiplier, sample_size, repeat, measure(bench_sample, (bbob_suite, fun_id, dim, instance_id, sample_size, sample_data_file_path, chunk_size)))
+                        if 'feature' in run_stages:
+                            for ela_feature_class in feature_classes:
+                                dim_redu = get_dim_redu(ela_feature_class)
+                                # As in compute_features, the dimensions that cannot be reduced by the PCA are skipped, so they are not measured
+                                if dim_redu == 'pca' and dim <= n_pca_components:
+                                    continue
+                                feature_file_path = get_feature_file_path(feature_dir_path, ela_feature_class, bbob_suite, fun_id, dim, instance_id, dim_redu, n_pca_components)
+                                backend = 'native' if ela_feature_class in native_classes else 'pflacco'
+                                if dim_redu == 'pca':
+                                    backend += '_' + pca_solver
+                                add_result('feature', ela_feature_class, backend, dim, fun_id, instance_id, multiplier, sample_size, repeat, measure(bench_feature, (ela_feature_class, sample_data_file_path, feature_file_path, n_pca_components, pca_solver, native_classes)))
+
+        # The names of the feature classes in the table are the prefixes of the feature files
+        table_feature_classes = []
+        table_dims = dims
+        for ela_feature_class in feature_classes:
+            if get_dim_redu(ela_feature_class) == 'pca':
+                table_feature_classes.append('tpca{}_{}'.format(n_pca_components, ela_feature_class))
+                # As in feature_aggregation.py, the dimensions that cannot be reduced by the PCA are not in the table
+                table_dims = [dim for dim in dims if dim > n_pca_components]
+            else:
+                table_feature_classes.append(ela_feature_class)
+        for repeat in range(n_repeats):
+            if 'table' in run_stages:
+                add_result('table', None, None, None, None, None, multiplier, None, repeat, measure(bench_table, (table_file_path, feature_dir_path, table_feature_classes, table_dims, fun_ids, instance_ids)))
+            if 'classify' in run_stages:
+                if len(fun_ids) < 2:
+                    print("Warning. The LOPO-CV needs at least two functions, so the classification is skipped")
+                    continue
+                for dim in table_dims:
+                    add_result('classify', None, None, dim, fun_ids[0], None, multiplier, multiplier * dim, repeat, measure(bench_classify, (table_file_path, dim, fun_ids[0], 'multimodality')))
+
+    return pd.DataFrame(results, columns=result_columns)
+
+# Fit log(wall time) = a + b log(n) + c log(d) for each stage, feature class, and backend, where n is the sample size and d is the dimension.
+# If only a single sample multiplier is used, n is proportional to d, so only the exponent of d (with n = multiplier * d) can be estimated. Similarly, only the exponent of n can be estimated if a single dimension is used.
+def fit_scaling_exponents(results_df):
+    fits = []
+    results_df = results_df.dropna(subset=['dim', 'sample_size'])
+    for (stage, ela_feature_class, backend), group_df in results_df.groupby(['stage', 'feature_class', 'backend'], dropna=False):
+        group_df = group_df.groupby(['dim', 'sample_size'], as_index=False)['wall_time'].median()
+        log_n = np.log(group_df['sample_size'].values.astype(float))
+        log_d = np.log(group_df['dim'].values.astype(float))
+        log_t = np.log(np.maximum(group_df['wall_time'].values, 1e-6))
+        n_dims = len(set(log_d))
+        n_sizes_per_dim = len(group_df) - n_dims
+
+        fit = {'stage': stage, 'feature_class': ela_feature_class, 'backend': backend, 'exponent_n': None, 'exponent_d': None, 'fit': None, 'n_points': len(group_df)}
+        if n_dims > 1 and n_sizes_per_dim > 0:
+            A = np.column_stack([np.ones(len(log_t)), log_n, log_d])
+            if np.linalg.matrix_rank(A) == 3:
+                coefs = np.linalg.lstsq(A, log_t, rcond=None)[0]
+                fit.update({'exponent_n': coefs[1], 'exponent_d': coefs[2], 'fit': 'n,d'})
+        if fit['fit'] is None and n_dims > 1:
+            coefs = np.polyfit(log_d, log_t, 1)
+            fit.update({'exponent_d': coefs[0], 'fit': 'd (n = multiplier * d)'})
+        elif fit['fit'] is None and len(set(log_n)) > 1:
+            coefs = np.polyfit(log_n, log_t, 1)
+            fit.update({'exponent_n': coefs[0], 'fit': 'n'})
+        # Convert the NaN keys from groupby to None for JSON
+        fits.append({key: (None if isinstance(value, float) and np.isnan(value) else value) for key, value in fit.items()})
+    return fits
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+# Compare the median wall times with those in a previous results file, and report the cells that became slower than "threshold" times
+def compare_results(results_df, base_results_df, threshold=1.2):
+    keys = ['stage', 'feature_class', 'backend', 'dim', 'multiplier']
+    new_df = results_df.groupby(keys, dropna=False, as_index=False)['wall_time'].median()
+    base_df = base_results_df.groupby(keys, dropna=False, as_index=False)['wall_time'].median()
+    merged_df = new_df.merge(base_df, on=keys, how='inner', suffixes=('', '_base'))
+    merged_df['ratio'] = merged_df['wall_time'] / merged_df['wall_time_base']
+    for _, row in merged_df.iterrows():
+        flag = 'REGRESSION' if row['ratio'] > threshold else ''
+        print("{}: class={}, backend={}, dimension={}, multiplier={}: {:.2f}s -> {:.2f}s (x{:.2f}) {}".format(row['stage'], row['feature_class'], row['backend'], row['dim'], row['multiplier'], row['wall_time_base'], row['wall_time'], row['ratio'], flag))
+    return merged_df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the stages of the pipeline and the feature classes')
+    parser.add_argument('--stages', nargs='+', choices=stages, default=stages)
+    parser.add_argument('--feature_classes', nargs='+', default=['basic', 'ela_distr', 'pca', 'limo', 'ic', 'disp', 'nbc', 'ela_level', 'ela_meta'])
+    parser.add_argument('--dims', type=int, nargs='+', default=[2, 5, 10, 20, 40])
+    parser.add_argument('--fun_ids', type=int, nargs='+', default=[1, 15])
+    parser.add_argument('--instance_ids', type=int, nargs='+', default=[1])
+    parser.add_argument('--sample_multipliers', type=int, nargs='+', default=[50], help='The sample size is multiplier * dimension. Two or more multipliers are needed to separate the exponents of n and d')
+    parser.add_argument('--n_repeats', type=int, default=1)
+    parser.add_argument('--pca_solver', choices=pca_solvers, default='auto')
+    parser.add_argument('--native_classes', nargs='*', choices=native_feature_classes, default=[])
+    parser.add_argument('--chunk_size', type=int, default=None, help='Benchmark the chunked sample creation of sample.py instead of the default one')
+    parser.add_argument('--work_dir_path', default='./benchmark_data', help='The directory for the samples, features, and tables created by the benchmark')
+    parser.add_argument('--sample_root_path', default=None, help="Use the existing samples in this directory (e.g., ./sample_data) instead of those in the work directory")
+    parser.add_argument('--results_file_path', default='./benchmark_results.csv')
+    parser.add_argument('--compare', default=None, help='A previous results file to compare with')
+    args = parser.parse_args()
+
+    results_df = run_benchmark(args.work_dir_path, args.stages, args.feature_classes, args.dims, args.fun_ids, args.instance_ids, args.sample_multipliers, args.n_repeats, pca_solver=args.pca_solver, native_classes=args.native_classes, chunk_size=args.chunk_size, sample_root_path=args.sample_root_path)
+    results_df.to_csv(args.results_file_path, index=False)
+
+    # The scaling exponents are saved together with the environment so that results from different versions can be compared
+    summary = {'git_commit': get_git_commit(),
+               'versions': library_versions(),
+               'python': platform.python_version(),
+               'machine': platform.machine(),
+               'n_cpus': os.cpu_count(),
+               'args': vars(args),
+               'scaling': fit_scaling_exponents(results_df)}
+    with open(os.path.splitext(args.results_file_path)[0] + '_scaling.json', 'w') as fh:
+        json.dump(summary, fh, indent=2, default=str)
+    for fit in summary['scaling']:
+        print("Scaling: stage={}, class={}, backend={}: exponent of n={}, exponent of d={} ({})".format(fit['stage'], fit['feature_class'], fit['backend'], fit['exponent_n'], fit['exponent_d'], fit['fit']))
+
+    if args.compare is not None:
+        compare_results(results_df, pd.read_csv(args.compare, header=0))
@@ -2,70 +2,179 @@
 
 import numpy as np
 import pandas as pd
-import csv
-import sys
+import argparse
+import multiprocessing
 import os
+import functools
+from pipeline_cache import default_manifest_file_path, PipelineCache
 
-def create_feature_table_data(table_file_path, feature_dir_path, all_feature_classes, dims):
-    all_fun_ids = range(1, 24+1)
-    all_instance_ids = range(1, 15+1)
-    my_high_level_prop_names = ['multimodality', 'globalstructure', 'separability', 'variablescaling', 'homogeneity', 'basinsizes', 'glcontrast', 'fungroup']
-    label_df = pd.read_csv('./high_level_fun_prop.csv', header=0)
-    
-    # 1. Set the name of each column
-    column_names = []
-    my_basic_feature_names = ['dim', 'fun', 'instance']
-    column_names.extend(my_basic_feature_names)
-    column_names.extend(my_high_level_prop_names)    
-            
-    # Extract the name of all the features
-    dim = dims[0]
-    instance_id = all_instance_ids[0]
-    fun_id = all_fun_ids[0]        
+problem_info_columns = ['dim', 'fun', 'instance']
+high_level_prop_names = ['multimodality', 'globalstructure', 'separability', 'variablescaling', 'homogeneity', 'basinsizes', 'glcontrast', 'fungroup']
+table_formats = ['csv', 'parquet', 'feather']
 
+def get_bbob_suite(dim):
     bbob_suite = 'bbob'
     if dim >= 20:
         bbob_suite = 'bbob-largescale'
-    
-    for ela_feature_class in all_feature_classes:
-        feature_file_path = os.path.join(feature_dir_path, '{}_{}_f{}_DIM{}_i{}.csv'.format(ela_feature_class, bbob_suite, fun_id, dim, instance_id))        
-        feature_data_set = np.loadtxt(feature_file_path, delimiter=",", comments="#", dtype=np.str)
-        feature_names = feature_data_set[:, 0].tolist()
-        column_names.extend(feature_names)   
-        
-    # 2. Make table data
-    table_df = pd.DataFrame(columns=column_names)
-
-    for dim in dims:
-        bbob_suite = 'bbob'
-        if dim >= 20:
-            bbob_suite = 'bbob-largescale'
-
-        for fun_id in all_fun_ids:
-            data_dict = {}
-            data_dict['dim'] = dim
-            data_dict['fun'] = fun_id
-            
-            for label in my_high_level_prop_names:
-                data_dict[label] = label_df.loc[fun_id - 1, label]
-
-            # For each instance, recode the feature values
-            for instance_id in all_instance_ids:
-                data_dict['instance'] = instance_id
-                
-                for ela_feature_class in all_feature_classes:
-                    feature_file_path = os.path.join(feature_dir_path, '{}_{}_f{}_DIM{}_i{}.csv'.format(ela_feature_class, bbob_suite, fun_id, dim, instance_id))                    
-                    feature_data_set = np.loadtxt(feature_file_path, delimiter=",", comments="#", dtype=np.str)
-                    for key, value in feature_data_set:
-                        data_dict[key] = value                        
-                table_df = table_df.append(pd.Series(data_dict), ignore_index=True)
+    return bbob_suite
+
+def parse_feature_value(s):
+    s = s.strip()
+    if s in ['True', 'TRUE']:
+        return 1.
+    elif s in ['False', 'FALSE']:
+        return 0.
+    elif s in ['NA', 'None', '']:
+        return np.nan
+    return float(s)
+
+# Read a feature file, where each line is "feature name,value"
+# If "allow_missing" is True, a missing feature file is regarded as an empty one, so that its features are NaN in the table
+def read_feature_file(feature_file_path, allow_missing=False):
+    names = []
+    values = []
+    if allow_missing and not os.path.exists(feature_file_path):
+        return names, values
+    with open(feature_file_path, 'r') as fh:
+        for line in fh:
+            if line.startswith('#') or len(line.strip()) == 0:
+                continue
+            key, value = line.rsplit(',', 1)
+            names.append(key)
+            values.append(parse_feature_value(value))
+    return names, values
+
+def get_row_keys(dims, fun_ids=range(1, 24+1), instance_ids=range(1, 15+1)):
+    return [(dim, fun_id, instance_id) for dim in dims for fun_id in fun_ids for instance_id in instance_ids]
+
+def get_feature_file_paths(feature_dir_path, feature_classes, dims, fun_ids=range(1, 24+1), instance_ids=range(1, 15+1)):
+    feature_file_paths = []
+    for ela_feature_class in feature_classes:
+        for dim, fun_id, instance_id in get_row_keys(dims, fun_ids, instance_ids):
+            feature_file_paths.append(os.path.join(feature_dir_path, '{}_{}_f{}_DIM{}_i{}.csv'.format(ela_feature_class, get_bbob_suite(dim), fun_id, dim, instance_id)))
+    return feature_file_paths
+
+# The cache key of a table depends on the contents of all the feature files in it
+def get_table_cache_key(cache, feature_dir_path, feature_classes, dims, table_formats=['csv'], allow_missing=False):
+    params = {'feature_classes': feature_classes, 'dims': dims, 'table_formats': table_formats}
+    feature_file_paths = get_feature_file_paths(feature_dir_path, feature_classes, dims)
+    if allow_missing:
+        params['allow_missing'] = True
+        params['missing_feature_file_paths'] = [path for path in feature_file_paths if not os.path.exists(path)]
+        feature_file_paths = [path for path in feature_file_paths if os.path.exists(path)]
+    return cache.compute_key('table', feature_file_paths + ['./high_level_fun_prop.csv'], params)
 
+# Read the features in "feature_classes" for all the combinations of "dims", "fun_ids" (the 24 functions by default), and "instance_ids" (the 15 instances by default).
+# The feature files are read in parallel by "n_workers" processes. Each column of the resulting table is built only once.
+# If "allow_missing" is True, the features in the missing feature files are NaN, e.g., for the feature classes that are not computed for some dimensions according to the plan of feature_planner.py. The columns with NaN are removed for each dimension by property_classification.py.
+def read_feature_columns(feature_dir_path, feature_classes, dims, n_workers=1, fun_ids=range(1, 24+1), instance_ids=range(1, 15+1), allow_missing=False):
+    row_keys = get_row_keys(dims, fun_ids, instance_ids)
+    feature_file_paths = get_feature_file_paths(feature_dir_path, feature_classes, dims, fun_ids, instance_ids)
+
+    read_feature_file_ = functools.partial(read_feature_file, allow_missing=allow_missing)
+    if n_workers == 1:
+        results = list(map(read_feature_file_, feature_file_paths))
+    else:
+        with multiprocessing.Pool(processes=n_workers) as pool:
+            results = pool.map(read_feature_file_, feature_file_paths, chunksize=64)
+
+    columns = {}
+    columns['dim'] = np.array([key[0] for key in row_keys])
+    columns['fun'] = np.array([key[1] for key in row_keys])
+    columns['instance'] = np.array([key[2] for key in row_keys])
+
+    n_rows = len(row_keys)
+    for i, ela_feature_class in enumerate(feature_classes):
+        class_results = results[i * n_rows:(i + 1) * n_rows]
+        # The names of the features are extracted from the first file
+        feature_names = next((names for names, _ in class_results if len(names) > 0), [])
+        if len(feature_names) == 0:
+            print("Warning. No feature file of {} was found, so skipped".format(ela_feature_class))
+        values = np.full((n_rows, len(feature_names)), np.nan)
+        for j, (names, row_values) in enumerate(class_results):
+            if names == feature_names:
+                values[j] = row_values
+            else:
+                row_dict = dict(zip(names, row_values))
+                values[j] = [row_dict.get(name, np.nan) for name in feature_names]
+        for k, name in enumerate(feature_names):
+            columns[name] = values[:, k]
+
+    return pd.DataFrame(columns)
+
+def add_labels(table_df):
+    label_df = pd.read_csv('./high_level_fun_prop.csv', header=0)
+    label_df = label_df.rename(columns={'function': 'fun'})
+    table_df = table_df.merge(label_df[['fun'] + high_level_prop_names], on='fun', how='left')
+    feature_columns = [c for c in table_df.columns if c not in problem_info_columns + high_level_prop_names]
+    return table_df[problem_info_columns + high_level_prop_names + feature_columns]
+
+def save_table(table_df, table_file_path, table_formats=['csv']):
     table_df.to_csv(table_file_path, index=False)    
+    base_path = os.path.splitext(table_file_path)[0]
+    if 'parquet' in table_formats:
+        table_df.to_parquet(base_path + '.parquet', index=False)
+    if 'feather' in table_formats:
+        table_df.to_feather(base_path + '.feather')
+
+def create_feature_table_data(table_file_path, feature_dir_path, all_feature_classes, dims, n_workers=1, table_formats=['csv'], allow_missing=False):
+    table_df = read_feature_columns(feature_dir_path, all_feature_classes, dims, n_workers, allow_missing=allow_missing)
+    table_df = add_labels(table_df)
+    save_table(table_df, table_file_path, table_formats)
+
+# Add new dimensions and/or new feature classes to an existing table in "base_table_file_path", without reading the feature files that are already in the table.
+# The name of each feature column starts with the name of its feature class, e.g., 'tpca2_ela_meta.lin_simple.adj_r2'.
+# The result is saved in "table_file_path". If "base_table_file_path" is None, the table in "table_file_path" is updated.
+def update_feature_table_data(table_file_path, feature_dir_path, all_feature_classes, dims, base_table_file_path=None, n_workers=1, table_formats=['csv'], allow_missing=False):
+    if base_table_file_path is None:
+        base_table_file_path = table_file_path
+    if not os.path.exists(base_table_file_path):
+        create_feature_table_data(table_file_path, feature_dir_path, all_feature_classes, dims, n_workers, table_formats, allow_missing)
+        return
+
+    table_df = pd.read_csv(base_table_file_path, header=0)
+    feature_columns = [c for c in table_df.columns if c not in problem_info_columns + high_level_prop_names]
+    old_classes = [c for c in all_feature_classes if any([column.split('.')[0] == c for column in feature_columns])]
+    new_classes = [c for c in all_feature_classes if c not in old_classes]
+    old_dims = [d for d in dims if d in set(table_df['dim'])]
+    new_dims = [d for d in dims if d not in old_dims]
+    print("Update: new feature classes={}, new dimensions={}".format(new_classes, new_dims))
+
+    table_df = table_df[table_df['dim'].isin(old_dims)].drop(columns=high_level_prop_names)
+    if len(new_classes) > 0 and len(old_dims) > 0:
+        new_columns_df = read_feature_columns(feature_dir_path, new_classes, old_dims, n_workers, allow_missing=allow_missing)
+        table_df = table_df.merge(new_columns_df, on=problem_info_columns, how='left')
+    if len(new_dims) > 0:
+        new_rows_df = read_feature_columns(feature_dir_path, old_classes + new_classes, new_dims, n_workers, allow_missing=allow_missing)
+        table_df = pd.concat([table_df, new_rows_df], ignore_index=True)
+
+    # Keep the order of the dimensions and the feature classes
+    table_df['dim'] = pd.Categorical(table_df['dim'], categories=dims, ordered=True)
+    table_df = table_df.sort_values(by=problem_info_columns, kind='stable')
+    table_df['dim'] = table_df['dim'].astype(int)
+    ordered_columns = problem_info_columns[:]
+    for ela_feature_class in all_feature_classes:
+        ordered_columns.extend([c for c in table_df.columns if c.split('.')[0] == ela_feature_class])
+    table_df = table_df[ordered_columns].reset_index(drop=True)
+
+    table_df = add_labels(table_df)
+    save_table(table_df, table_file_path, table_formats)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Make table data by aggregating features')
+    parser.add_argument('--n_workers', type=int, default=os.cpu_count(), help='The number of processes that read the feature files')
+    parser.add_argument('--table_formats', nargs='+', choices=table_formats, default=['csv'], help="The formats of the table. 'parquet' and 'feather' require pyarrow")
+    parser.add_argument('--update', action='store_true', help='Add new dimensions and feature classes to the existing table')
+    parser.add_argument('--base_table_file_path', default=None, help="The existing table for '--update'. By default, the table with the same name is updated")
+    parser.add_argument('--allow_missing', action='store_true', help="Regard the features in missing feature files as NaN, e.g., for the feature classes skipped by the plan of feature_planner.py")
+    parser.add_argument('--cache', action='store_true', help='Skip making the table if it is up to date with the feature files according to the manifest of pipeline_cache.py')
+    parser.add_argument('--manifest_file_path', default=default_manifest_file_path, help="The manifest file for '--cache'")
+    parser.add_argument('--feature_classes', nargs='+', default=['basic', 'ela_distr', 'pca', 'limo', 'ic', 'disp', 'nbc', 'tpca2_ela_level', 'tpca2_ela_meta'], help="The feature classes in the table. The feature classes computed after the PCA with m components are prefixed by 'tpca{m}_', e.g., 'tpca2_cm_angle'")
+    args = parser.parse_args()
+
     # Make table data by aggregating features
     #all_feature_classes = ['basic', 'ela_distr', 'pca', 'limo', 'ic', 'disp', 'nbc', 'ela_level', 'ela_meta']
-    all_feature_classes = ['basic', 'ela_distr', 'pca', 'limo', 'ic', 'disp', 'nbc', 'tpca2_ela_level', 'tpca2_ela_meta']    
+    all_feature_classes = args.feature_classes
     dims = [3, 5, 10, 20, 40, 80, 160, 320, 640]
 
     # If you used another sampling method, please rewrite the following line.
@@ -79,4 +188,27 @@ if __name__ == '__main__':
     dims_str = '_'.join([str(d) for d in dims])
     table_file_path = os.path.join(table_dir_path, '{}_{}_dims{}.csv'.format(sample_method, features_str, dims_str))
 
-    create_feature_table_data(table_file_path, feature_dir_path, all_feature_classes, dims)
+    cache = None
+    fresh = False
+    if args.cache:
+        cache = PipelineCache(args.manifest_file_path)
+        key = get_table_cache_key(cache, feature_dir_path, all_feature_classes, dims, args.table_formats, args.allow_missing)
+        fresh = cache.is_fresh('table', table_file_path, key)
+        if fresh:
+            print("The table is up to date: {}".format(table_file_path))
+
+    if not fresh:
+        if args.update:
+            update_feature_table_data(table_file_path, feature_dir_path, all_feature_classes, dims, args.base_table_file_path, args.n_workers, args.table_formats, args.allow_missing)
+        else:
+            create_feature_table_data(table_file_path, feature_dir_path, all_feature_classes, dims, args.n_workers, args.table_formats, args.allow_missing)
+        if cache is not None:
+            cache.record('table', table_file_path, key)
+            for table_format in args.table_formats:
+                if table_format != 'csv':
+                    cache.record('table', os.path.splitext(table_file_path)[0] + '.' + table_format, key)
+
+    if cache is not None:
+        cache.save()
+        cache.report()
+
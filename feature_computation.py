@@ -2,8 +2,18 @@
 
 import numpy as np
 from pflacco.pflacco import create_feature_object, calculate_feature_set, calculate_features
-import sys
 import os
+import time
+import argparse
+import functools
+from sample_store import sample_formats, get_sample_data_file_path, load_sample
+from native_features import native_feature_classes, create_native_feature_object, calculate_native_feature_set
+from pipeline_cache import default_manifest_file_path, PipelineCache
+from instrumentation import PhaseProfile, write_records, match_task_pattern
+from worker_pool import run_sequentially, run_in_pool
+from feature_planner import read_plan, split_table_class
+import cProfile
+import csv
 
 # For PCA-BO
 from scipy.stats import rankdata, norm
@@ -20,122 +30,493 @@ def scale_X(X, func_vals):
     w /= np.sum(w)
     return X_ * w.reshape(-1, 1)
 
-def compute_features(ela_feature_class, sample_data_file_path, feature_file_path, dim_redu='none', n_pca_components=None):
+cell_mapping_classes = ['cm_angle', 'cm_conv', 'cm_grad', 'gcm']
+# The feature classes in flacco that can be computed by this script
+ela_feature_class_names = ['basic', 'ela_distr', 'pca', 'limo', 'ic', 'disp', 'nbc', 'ela_level', 'ela_meta'] + cell_mapping_classes
+# The feature classes computed after the weighted PCA by default
+default_pca_classes = ['ela_level', 'ela_meta']
+
+pca_solvers = ['auto', 'full', 'randomized', 'arpack', 'eigh']
+
+# Select the PCA solver based on the sample size n, the dimension d, and the number of components m.
+# Only the exact solvers are selected: the full SVD, which is cheap enough for small samples and for n < d, and the eigen-decomposition of the d x d covariance matrix when n >= d and d is moderate, which is the case for the sample size 50 * d.
+# The iterative solvers are not selected. In particular, the randomized SVD needs many power iterations to be accurate since the weighted sample often has a flat spectrum. They can still be specified explicitly.
+def select_pca_solver(n, d, m):
+    if n * d <= 100000 or m >= 0.8 * min(n, d) or n < d or d > 5000:
+        return 'full'
+    return 'eigh'
+
+# Project X onto the first m principal components by the eigen-decomposition of the covariance matrix X^T X.
+# For each component, the sign is determined so that the loading with the largest absolute value is positive, which is the same as sklearn.decomposition.PCA.
+def eigh_pca_fit_transform(X, n_pca_components):
+    X_ = X - X.mean(axis=0)
+    eigen_values, eigen_vectors = np.linalg.eigh(X_.T @ X_)
+    components = eigen_vectors[:, ::-1][:, :n_pca_components].T
+    max_abs_ids = np.argmax(np.abs(components), axis=1)
+    signs = np.sign(components[range(n_pca_components), max_abs_ids])
+    components *= signs.reshape(-1, 1)
+    return X_ @ components.T
+
+# Dimensionality reduction by the weighted PCA strategy in PCA-BO
+# https://github.com/wangronin/Bayesian-Optimization
+def reduce_dim(sample_x, sample_f, n_pca_components, pca_solver='full', random_state=0):
+    return pca_fit_transform(scale_X(sample_x, sample_f), sample_f, n_pca_components, pca_solver, random_state)
+
+# The PCA step of reduce_dim for the sample X that has already been weighted by scale_X
+def pca_fit_transform(sample_x, sample_f, n_pca_components, pca_solver='full', random_state=0):
+    if pca_solver == 'auto':
+        pca_solver = select_pca_solver(len(sample_x), len(sample_x[0]), n_pca_components)
+
+    if pca_solver == 'eigh':
+        return eigh_pca_fit_transform(sample_x, n_pca_components)
+    elif pca_solver in ['full', 'randomized', 'arpack']:
+        pca = PCA(n_components=n_pca_components, svd_solver=pca_solver, random_state=random_state)
+        return pca.fit_transform(sample_x, sample_f)
+    else:
+        error_msg = "Error: %s is not defined." %(pca_solver)
+        raise Exception(error_msg)
+
+# If "backend" is 'native', the feature object for native_features.py is created, instead of that for pflacco
+def create_bbob_feature_object(sample_x, sample_f, dim_redu, cell_mapping, backend='pflacco'):
     bbob_lower_bound = -5
     bbob_upper_bound = 5
-    
+
     n_cell_blocks = None
-    if ela_feature_class in ['cm_angle', 'cm_conv', 'cm_grad', 'gcm']:
+    if cell_mapping:
         n_cell_blocks = 3
-    
-    data_set = np.loadtxt(sample_data_file_path, delimiter=",", comments="#", dtype=np.float)
-    sample_f = data_set[:, 0]
-    sample_x = data_set[:, 1:]
-
-    if dim_redu == 'pca' and len(sample_x[0]) <= n_pca_components:
-        print("Warning. It is impossible to reduce the original dimension {} to a higher dimension {}, so skipped".format(len(sample_x[0]), n_pca_components))
-        return 0    
-    
-    # Dimensionality reduction by the weighted PCA strategy in PCA-BO
-    # https://github.com/wangronin/Bayesian-Optimization
-    if dim_redu == 'pca':
-        sample_x = scale_X(sample_x, sample_f)
-        pca = PCA(n_components=n_pca_components, svd_solver='full')
-        sample_x = pca.fit_transform(sample_x, sample_f)        
 
-    if dim_redu == 'pca' and ela_feature_class in ['cm_angle', 'cm_conv', 'cm_grad', 'gcm']:
+    if dim_redu == 'pca' and cell_mapping:
         # Normalize each point x in the sample X into the range [0,1]^m
         min_values = np.min(sample_x, axis=0)
         max_values = np.max(sample_x, axis=0)
         sample_x = (sample_x - min_values) / (max_values - min_values)
         bbob_lower_bound = 0
         bbob_upper_bound = 1        
-        
-    feat_object = create_feature_object(x=sample_x, y=sample_f, minimize=True, lower=bbob_lower_bound, upper=bbob_upper_bound, blocks=n_cell_blocks)    
 
-    try:
-        # The calculate_feature_set function returns a dictionary object 
-        feature_dict = calculate_feature_set(feat_object, ela_feature_class)
-    except rpy2.rinterface_lib.embedded.RRuntimeError as e:
-        print(e)
+    if backend == 'native':
+        return create_native_feature_object(x=sample_x, y=sample_f, minimize=True, lower=bbob_lower_bound, upper=bbob_upper_bound, blocks=n_cell_blocks)
+    return create_feature_object(x=sample_x, y=sample_f, minimize=True, lower=bbob_lower_bound, upper=bbob_upper_bound, blocks=n_cell_blocks)    
 
-
-    if dim_redu == 'pca':
-        with open(feature_file_path, 'w') as fh:
+# The features are written to a temporary file first so that a task aborted by the timeout never leaves a half-written feature file
+def write_features(feature_file_path, feature_dict, dim_redu='none', n_pca_components=None, comments=[]):
+    tmp_file_path = feature_file_path + '.tmp'
+    with open(tmp_file_path, 'w') as fh:
+        # The comment lines are skipped by feature_aggregation.py
+        for comment in comments:
+            fh.write('# {}\n'.format(comment))
+        if dim_redu == 'pca':
             for key, value in feature_dict.items():
                 fh.write('tpca{}_{},{}\n'.format(n_pca_components, key, value))            
-    else:
-        with open(feature_file_path, 'w') as fh:
+        else:
             for key, value in feature_dict.items():
                 fh.write('{},{}\n'.format(key, value))            
+    os.replace(tmp_file_path, feature_file_path)
+
+# The sample sizes for the adaptive mode: "adaptive_multipliers" * dimension, followed by the full sample size n
+def get_adaptive_sample_sizes(n, dim, adaptive_multipliers):
+    return sorted(set([mult * dim for mult in adaptive_multipliers if mult * dim < n])) + [n]
+
+# The maximum change of the feature values between two subsamples relative to max(|old value|, 1), i.e., the change is absolute for the features close to zero (e.g., the skewness and the adjusted R^2). The costs and the non-numeric values are ignored. A feature that is NaN in either of them is regarded as an infinite change, since a NaN on a small subsample (e.g., the adjusted R^2 of a linear model with more terms than points) may be finite on the full sample.
+# Different sets of features are also an infinite change, e.g., the 'cm_conv.occupied.*' features on a subsample with fewer points than cells and the 'cm_conv.*' features on the full sample.
+def max_relative_change(old_feature_dict, new_feature_dict):
+    old_keys = set([key for key in old_feature_dict if 'costs_' not in key])
+    new_keys = set([key for key in new_feature_dict if 'costs_' not in key])
+    if old_keys != new_keys:
+        return np.inf
+
+    max_change = 0.
+    for key, new_value in new_feature_dict.items():
+        if 'costs_' in key:
+            continue
+        try:
+            old_value = float(old_feature_dict[key])
+            new_value = float(new_value)
+        except (TypeError, ValueError):
+            continue
+        if np.isnan(old_value) or np.isnan(new_value):
+            return np.inf
+        max_change = max(max_change, abs(new_value - old_value) / max(abs(old_value), 1.))
+    return max_change
+
+# Compute the features in "ela_feature_classes" based on a single sample file.
+# The sample is loaded only once, and the weighted PCA and each feature object are also created only once. Then, the features in each class are computed by the corresponding feature object and saved in "feature_file_paths".
+# The feature classes in "native_classes" are computed by native_features.py without R, and the others are computed by pflacco. "native_memory_budget" (bytes) and "native_n_threads" are the memory budget for the pairwise distances and the number of threads in native_features.py.
+# "n_pca_components" is the number of components m for all the feature classes or a list of m for each of them. The weighted PCA is performed only once with the largest m, and the projection for each smaller m is its first m columns, since the principal components are sorted in descending order of their variances.
+# The feature classes in "adaptive_classes" are computed on nested subsamples of the sample, whose sizes are "adaptive_multipliers" * dimension and the full sample size. The computation stops when the maximum change of the features from the previous subsample (see max_relative_change) is at most "adaptive_tol". An error on a subsample smaller than the full sample is not a failure, but the computation continues with the next subsample. The features on the last subsample are saved, and its size and the changes are written in the comment lines of the feature file. The subsamples are the first points in a fixed random permutation of the sample, and the weighted PCA is performed on each subsample.
+# An error in a feature class (e.g., an error of flacco) does not stop the other feature classes. The feature file of the class is not written, and the pair of the feature file and the error message is returned.
+# If "profile" (a PhaseProfile in instrumentation.py) is given, each phase is timed. Since a .npy sample is memory-mapped, the time to read it from the disk is included in the phase that first touches it (usually scale_X or the feature object creation), not in 'load'.
+def compute_features_single_pass(ela_feature_classes, sample_data_file_path, feature_file_paths, dim_redus, n_pca_components=None, pca_solver='full', native_classes=[], profile=None, adaptive_classes=[], adaptive_multipliers=[10, 20, 40], adaptive_tol=0.05, native_memory_budget=2**28, native_n_threads=1):
+    if profile is None:
+        profile = PhaseProfile(enabled=False)
+
+    with profile.phase('load', feature_class=None) as info:
+        sample_x, sample_f = load_sample(sample_data_file_path)
+        info.update({'n': len(sample_x), 'd': len(sample_x[0]), 'nbytes': sample_x.nbytes + sample_f.nbytes})
+    n, dim = len(sample_x), len(sample_x[0])
+
+    if not isinstance(n_pca_components, (list, tuple)):
+        n_pca_components = [n_pca_components] * len(ela_feature_classes)
+    # The largest m that is smaller than the original dimension
+    max_n_pca_components = max([m for m, dim_redu in zip(n_pca_components, dim_redus) if dim_redu == 'pca' and m < dim], default=None)
+
+    subsample_ids = None
+    if any([c in adaptive_classes for c in ela_feature_classes]):
+        subsample_ids = np.random.RandomState(0).permutation(n)
+
+    # The (sub)sample, its projection by the weighted PCA, and the feature objects are created only once for each subsample size
+    subsamples = {}
+    reduced_sample_xs = {}
+    feat_objects = {}
+    def get_feat_object(n_sub, dim_redu, m, cell_mapping, backend, ela_feature_class):
+        if n_sub not in subsamples:
+            if n_sub == n:
+                subsamples[n_sub] = (sample_x, sample_f)
+            else:
+                subsamples[n_sub] = (sample_x[np.sort(subsample_ids[:n_sub])], sample_f[np.sort(subsample_ids[:n_sub])])
+        x, f = subsamples[n_sub]
+
+        if dim_redu == 'pca' and n_sub not in reduced_sample_xs:
+            with profile.phase('scale_X', feature_class=None, n=n_sub, d=dim):
+                scaled_x = scale_X(x, f)
+            with profile.phase('pca_fit', feature_class=None, n=n_sub, d=dim, m=max_n_pca_components, pca_solver=pca_solver):
+                reduced_sample_xs[n_sub] = pca_fit_transform(scaled_x, f, max_n_pca_components, pca_solver)
+            del scaled_x
+
+        key = (n_sub, dim_redu, m, cell_mapping, backend)
+        if key not in feat_objects:
+            if dim_redu == 'pca':
+                x = np.ascontiguousarray(reduced_sample_xs[n_sub][:, :m])
+            with profile.phase('create_feature_object', feature_class=ela_feature_class, backend=backend, dim_redu=dim_redu, m=m, n=len(x), d=len(x[0])):
+                feat_objects[key] = create_bbob_feature_object(x, f, dim_redu, cell_mapping, backend)
+        return feat_objects[key]
+
+    failures = []
+    for ela_feature_class, feature_file_path, dim_redu, m in zip(ela_feature_classes, feature_file_paths, dim_redus, n_pca_components):
+        if dim_redu == 'pca' and dim <= m:
+            print("Warning. It is impossible to reduce the original dimension {} to a higher dimension {}, so skipped".format(dim, m))
+            continue
+
+        cell_mapping = ela_feature_class in cell_mapping_classes
+        backend = 'pflacco'
+        if ela_feature_class in native_classes:
+            backend = 'native'
+        if dim_redu != 'pca':
+            m = None
+        sample_sizes = [n]
+        if ela_feature_class in adaptive_classes:
+            sample_sizes = get_adaptive_sample_sizes(n, dim, adaptive_multipliers)
+
+        prev_feature_dict = None
+        trace = []
+        failed = False
+        for n_sub in sample_sizes:
+            try:
+                feat_object = get_feat_object(n_sub, dim_redu, m, cell_mapping, backend, ela_feature_class)
+                with profile.phase('calculate', feature_class=ela_feature_class, backend=backend, dim_redu=dim_redu, m=m, n=n_sub) as info:
+                    if backend == 'native':
+                        feature_dict = calculate_native_feature_set(feat_object, ela_feature_class, native_memory_budget, native_n_threads)
+                    else:
+                        # The calculate_feature_set function returns a dictionary object 
+                        feature_dict = calculate_feature_set(feat_object, ela_feature_class)
+                    info['n_features'] = len(feature_dict)
+            except Exception as e:
+                # An error on a subsample is regarded as not converged, and the next subsample is not compared with it
+                if n_sub < n:
+                    print("Warning. {} failed on the subsample of size {} of {}, so the next subsample is used: {}".format(ela_feature_class, n_sub, sample_data_file_path, e))
+                    trace.append((n_sub, np.inf))
+                    prev_feature_dict = None
+                    continue
+                # E.g., RRuntimeError of rpy2 for an error in flacco
+                print("Error: {} failed on {}: {}".format(ela_feature_class, sample_data_file_path, e))
+                failures.append((feature_file_path, str(e)))
+                failed = True
+                break
+
+            if prev_feature_dict is None:
+                trace.append((n_sub, np.nan))
+            else:
+                trace.append((n_sub, max_relative_change(prev_feature_dict, feature_dict)))
+                if trace[-1][1] <= adaptive_tol:
+                    break
+            prev_feature_dict = feature_dict
+        if failed:
+            continue
+
+        comments = []
+        if ela_feature_class in adaptive_classes:
+            comments = ['adaptive_n={},full_n={},converged={}'.format(trace[-1][0], n, trace[-1][1] <= adaptive_tol),
+                        'adaptive_trace=' + ';'.join(['{}:{:.6g}'.format(n_sub, change) for n_sub, change in trace])]
+        with profile.phase('write', feature_class=ela_feature_class, dim_redu=dim_redu, m=m):
+            write_features(feature_file_path, feature_dict, dim_redu, m, comments)
+
+    return failures
+
+def compute_features(ela_feature_class, sample_data_file_path, feature_file_path, dim_redu='none', n_pca_components=None, pca_solver='full', native_classes=[], profile=None, adaptive_classes=[], adaptive_multipliers=[10, 20, 40], adaptive_tol=0.05, native_memory_budget=2**28, native_n_threads=1):
+    return compute_features_single_pass([ela_feature_class], sample_data_file_path, [feature_file_path], [dim_redu], n_pca_components, pca_solver, native_classes, profile, adaptive_classes, adaptive_multipliers, adaptive_tol, native_memory_budget, native_n_threads)
+
+# Dimensionality reduction is performed only for the feature classes in "pca_classes" ('ela_level' and 'ela_meta' by default)
+# If you want to compute the 'ela_level' and 'ela_meta' features as is, please use an empty list, e.g., "--pca_classes" without any class. The cell mapping classes can be computed after the PCA by "--pca_classes cm_angle cm_conv cm_grad gcm".
+def get_dim_redu(ela_feature_class, pca_classes=default_pca_classes):
+    dim_redu = 'none'
+    if ela_feature_class in pca_classes:
+        dim_redu = 'pca'
+    return dim_redu
+
+def get_bbob_suite(dim):
+    # The noiseless BBOB function set is used for 2, 3, 5, and 10 dimensions, and the large-scale BBOB function set is used for >= 20 dimensions
+    bbob_suite = 'bbob'
+    if dim >= 20:
+        bbob_suite = 'bbob-largescale'
+    return bbob_suite
+
+def get_feature_file_path(feature_dir_path, ela_feature_class, bbob_suite, fun_id, dim, instance_id, dim_redu='none', n_pca_components=None):
+    if dim_redu == 'pca':
+        return os.path.join(feature_dir_path, 'tpca{}_{}_{}_f{}_DIM{}_i{}.csv'.format(n_pca_components, ela_feature_class, bbob_suite, fun_id, dim, instance_id))
+    return os.path.join(feature_dir_path, '{}_{}_f{}_DIM{}_i{}.csv'.format(ela_feature_class, bbob_suite, fun_id, dim, instance_id))
+
+# Make a list of tasks. Each task corresponds to a single call of compute_features.
+# If "n_pca_components" is a list, the tasks for the feature classes with the PCA are created for each m in it. Since the tasks for the same sample file are grouped, the weighted PCA is performed only once for all the m values.
+# The feature classes in "pca_classes" are computed after the PCA (see get_dim_redu).
+def create_tasks(all_feature_classes, dims, fun_ids, instance_ids, sample_dir_path, feature_dir_path, n_pca_components=2, sample_format='npy', pca_classes=default_pca_classes):
+    if not isinstance(n_pca_components, (list, tuple)):
+        n_pca_components = [n_pca_components]
+
+    tasks = []
+    for ela_feature_class in all_feature_classes:
+        dim_redu = get_dim_redu(ela_feature_class, pca_classes)
+        ms = [None]
+        if dim_redu == 'pca':
+            ms = n_pca_components
+        for m in ms:
+            for dim in dims:
+                bbob_suite = get_bbob_suite(dim)
+                for fun_id in fun_ids:
+                    for instance_id in instance_ids:
+                        sample_data_file_path = get_sample_data_file_path(sample_dir_path, bbob_suite, fun_id, dim, instance_id, sample_format)
+                        feature_file_path = get_feature_file_path(feature_dir_path, ela_feature_class, bbob_suite, fun_id, dim, instance_id, dim_redu, m)
+                        tasks.append((ela_feature_class, dim, fun_id, instance_id, sample_data_file_path, feature_file_path, dim_redu, m))
+    return tasks
+
+# Make a list of tasks for the feature classes chosen by feature_planner.py for each dimension. The feature classes in "all_feature_classes" are used for the dimensions that are not in the plan.
+# Whether the PCA is performed for a feature class in the plan is determined by its name in the table (e.g., 'tpca2_ela_meta'), not by "pca_classes".
+def create_tasks_from_plan(plan, all_feature_classes, dims, fun_ids, instance_ids, sample_dir_path, feature_dir_path, n_pca_components=2, sample_format='npy', pca_classes=default_pca_classes):
+    tasks = []
+    for dim in dims:
+        if dim not in plan:
+            print("Warning. Dimension={} is not in the plan, so all the feature classes are computed".format(dim))
+            tasks.extend(create_tasks(all_feature_classes, [dim], fun_ids, instance_ids, sample_dir_path, feature_dir_path, n_pca_components, sample_format, pca_classes))
+            continue
+        for table_class in plan[dim]:
+            ela_feature_class, m = split_table_class(table_class)
+            class_pca_classes = [ela_feature_class] if m is not None else []
+            tasks.extend(create_tasks([ela_feature_class], [dim], fun_ids, instance_ids, sample_dir_path, feature_dir_path, m, sample_format, class_pca_classes))
+    return tasks
+
+# Group the tasks that share the same sample file so that they are computed by a single call of compute_features_single_pass
+def group_tasks(tasks):
+    groups = {}
+    for task in tasks:
+        groups.setdefault(task[4], []).append(task)
+    return list(groups.values())
+
+# If "instrument" is True, the phase records of the task group are returned. If any task in the group matches one of "cprofile_patterns" (see instrumentation.match_task_pattern), the task group is profiled by cProfile and the result is dumped in "cprofile_dir_path".
+def run_task(task_group, pca_solver='full', native_classes=[], instrument=False, cprofile_patterns=[], cprofile_dir_path='./cprofile', adaptive_classes=[], adaptive_multipliers=[10, 20, 40], adaptive_tol=0.05, native_memory_budget=2**28, native_n_threads=1):
+    start_time = time.time()
+    ela_feature_classes = [task[0] for task in task_group]
+    feature_file_paths = [task[5] for task in task_group]
+    dim_redus = [task[6] for task in task_group]
+    n_pca_components = [task[7] for task in task_group]
+    dim, fun_id, instance_id, sample_data_file_path = task_group[0][1], task_group[0][2], task_group[0][3], task_group[0][4]
+    bbob_suite = get_bbob_suite(dim)
+
+    tags = {'suite': bbob_suite, 'fun': fun_id, 'dim': dim, 'instance': instance_id, 'pid': os.getpid()}
+    profile = PhaseProfile(tags, enabled=instrument)
+    profiler = None
+    if any([match_task_pattern(pattern, task[0], dim, fun_id, instance_id) for pattern in cprofile_patterns for task in task_group]):
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    failures = compute_features_single_pass(ela_feature_classes, sample_data_file_path, feature_file_paths, dim_redus, n_pca_components, pca_solver, native_classes, profile, adaptive_classes, adaptive_multipliers, adaptive_tol, native_memory_budget, native_n_threads)
+
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(cprofile_dir_path, exist_ok=True)
+        profiler.dump_stats(os.path.join(cprofile_dir_path, '{}_{}_f{}_DIM{}_i{}.prof'.format('_'.join(ela_feature_classes), bbob_suite, fun_id, dim, instance_id)))
+    return time.time() - start_time, profile.records, failures
+
+# Return the modification time of a file in nanoseconds, or None if it does not exist
+def get_mtime(file_path):
+    if not os.path.exists(file_path):
+        return None
+    return os.stat(file_path).st_mtime_ns
+
+# Append the failed tasks to "failed_tasks_file_path" with the reasons. The tasks can be run again by "--resume", which skips only the tasks whose feature files exist.
+def record_failed_tasks(failed_tasks_file_path, tasks, reason):
+    new_file = not os.path.exists(failed_tasks_file_path)
+    with open(failed_tasks_file_path, 'a', newline='') as fh:
+        writer = csv.writer(fh)
+        if new_file:
+            writer.writerow(['feature_class', 'dim', 'fun', 'instance', 'sample_data_file_path', 'feature_file_path', 'reason'])
+        for task in tasks:
+            writer.writerow([task[0], task[1], task[2], task[3], task[4], task[5], reason.strip().split('\n')[-1]])
+
+
+# A task of the PCA to a dimension not lower than the original one is skipped by compute_features_single_pass, so it writes no feature file
+def is_skipped_task(task):
+    return task[6] == 'pca' and task[1] <= task[7]
+
+# The cache key of a task depends on the contents of the sample file and on all the settings that change the feature values
+def get_task_cache_key(cache, task, pca_solver='full', native_classes=[], adaptive_classes=[], adaptive_multipliers=[10, 20, 40], adaptive_tol=0.05, native_memory_budget=2**28, native_n_threads=1):
+    ela_feature_class, sample_data_file_path, dim_redu, n_pca_components = task[0], task[4], task[6], task[7]
+    params = {'feature_class': ela_feature_class, 'dim_redu': dim_redu}
+    if dim_redu == 'pca':
+        params['n_pca_components'] = n_pca_components
+        params['pca_solver'] = pca_solver
+    params['backend'] = 'native' if ela_feature_class in native_classes else 'pflacco'
+    if params['backend'] == 'native':
+        # The blocks of rows depend on the memory budget, which can change the rounding errors of the distances. The number of threads is also recorded since it can change the results of BLAS
+        params['native_memory_budget'] = native_memory_budget
+        params['native_n_threads'] = native_n_threads
+    if ela_feature_class in adaptive_classes:
+        params['adaptive_multipliers'] = sorted(adaptive_multipliers)
+        params['adaptive_tol'] = adaptive_tol
+    return cache.compute_key('feature', [sample_data_file_path], params)
+
+# Run the tasks by a process pool with "n_workers" workers.
+# The tasks are sorted in descending order of the dimension so that the tasks with 640 dimensions are not stragglers at the end of the run.
+# If "resume" is True, the tasks whose feature files already exist are skipped.
+# If "single_pass" is True, all the feature classes for each sample file are computed at once by compute_features_single_pass.
+# If "cache" (a PipelineCache in pipeline_cache.py) is given, the tasks whose feature files are up to date with respect to the sample file and the settings are skipped. The tasks skipped by is_skipped_task are neither hits nor misses. A task whose sample file does not exist is a miss, and it fails as usual.
+# If "instrument_file_path" is given, the phase records of all the tasks are appended to it as JSON lines (see instrumentation.py).
+# "adaptive_classes", "adaptive_multipliers", and "adaptive_tol" are for the adaptive mode of compute_features_single_pass, and "native_memory_budget" and "native_n_threads" are for native_features.py.
+# The workers are long-lived processes in worker_pool.py. A task group running longer than "timeout" seconds is aborted, and each worker is replaced by a new one after "max_tasks_per_worker" task groups. The timeout applies to the whole task group, i.e., all the feature classes for a sample file if "single_pass" is True, and to each feature class otherwise.
+# The failed tasks are recorded in "failed_tasks_file_path" and do not abort the run. When a task group is aborted, the feature files written before the abort are kept (and recorded in the cache), and only the other tasks are recorded as failed.
+def run_tasks(tasks, n_workers=1, resume=False, single_pass=True, pca_solver='full', native_classes=[], cache=None, instrument_file_path=None, cprofile_patterns=[], cprofile_dir_path='./cprofile', timeout=None, max_tasks_per_worker=None, failed_tasks_file_path='./failed_tasks.csv', adaptive_classes=[], adaptive_multipliers=[10, 20, 40], adaptive_tol=0.05, native_memory_budget=2**28, native_n_threads=1):
+    if resume:
+        n_all_tasks = len(tasks)
+        tasks = [task for task in tasks if not (os.path.exists(task[5]) and os.path.getsize(task[5]) > 0)]
+        print("Resume: {} of {} tasks have already been done, so skipped".format(n_all_tasks - len(tasks), n_all_tasks))
+    if cache is not None:
+        tasks = [task for task in tasks if not is_skipped_task(task)]
+        task_keys = {task: get_task_cache_key(cache, task, pca_solver, native_classes, adaptive_classes, adaptive_multipliers, adaptive_tol, native_memory_budget, native_n_threads) for task in tasks}
+        tasks = [task for task in tasks if not cache.is_fresh('feature', task[5], task_keys[task])]
+        cache.report()
+    tasks = sorted(tasks, key=lambda task: task[1], reverse=True)
+
+    n_tasks = len(tasks)
+    if n_tasks == 0:
+        return
+
+    for task in tasks:
+        os.makedirs(os.path.dirname(task[5]), exist_ok=True)
+    # A feature file is written by a task group if its modification time changes
+    old_mtimes = {task[5]: get_mtime(task[5]) for task in tasks}
+
+    if single_pass:
+        task_groups = group_tasks(tasks)
+    else:
+        task_groups = [[task] for task in tasks]
+
+    run_task_ = functools.partial(run_task, pca_solver=pca_solver, native_classes=native_classes, instrument=instrument_file_path is not None, cprofile_patterns=cprofile_patterns, cprofile_dir_path=cprofile_dir_path, adaptive_classes=adaptive_classes, adaptive_multipliers=adaptive_multipliers, adaptive_tol=adaptive_tol, native_memory_budget=native_memory_budget, native_n_threads=native_n_threads)
+    start_time = time.time()
+    if n_workers == 1 and timeout is None:
+        results = run_sequentially(run_task_, task_groups)
+    else:
+        # The workers are forked from this process, where R and flacco have already been loaded by pflacco, and they are kept alive across the tasks
+        results = run_in_pool(run_task_, task_groups, n_workers, timeout, max_tasks_per_worker)
+
+    n_done = 0
+    n_failed = 0
+    for task_group, status, value in results:
+        n_done += len(task_group)
+        ela_feature_classes = [task[0] for task in task_group]
+        dim, fun_id, instance_id = task_group[0][1:4]
+        failed_file_paths = []
+        if status == 'done':
+            task_time, records, failures = value
+            if instrument_file_path is not None:
+                write_records(records, instrument_file_path)
+            for feature_file_path, reason in failures:
+                record_failed_tasks(failed_tasks_file_path, [task for task in task_group if task[5] == feature_file_path], reason)
+                failed_file_paths.append(feature_file_path)
+        else:
+            task_time = np.nan
+            print("Error: Feature={}, dimension={},  f={}, instance ID={}: {}".format(','.join(ela_feature_classes), dim, fun_id, instance_id, value))
+            # The skipped tasks write no feature file, but they are not failures
+            failed_tasks = [task for task in task_group if get_mtime(task[5]) in [None, old_mtimes[task[5]]] and not is_skipped_task(task)]
+            record_failed_tasks(failed_tasks_file_path, failed_tasks, value)
+            failed_file_paths = [task[5] for task in failed_tasks]
+        n_failed += len(failed_file_paths)
+
+        elapsed_time = time.time() - start_time
+        eta = elapsed_time / n_done * (n_tasks - n_done)
+        print("Done: Feature={}, dimension={},  f={}, instance ID={} ({:.1f}s) [{}/{}, failed={}, elapsed={:.0f}s, ETA={:.0f}s]".format(','.join(ela_feature_classes), dim, fun_id, instance_id, task_time, n_done, n_tasks, n_failed, elapsed_time, eta))
+        if cache is not None:
+            for task in task_group:
+                # The feature file of a failed task may be an old one
+                if os.path.exists(task[5]) and task[5] not in failed_file_paths:
+                    cache.record('feature', task[5], task_keys[task])
+
+    if cache is not None:
+        cache.save()
+    print("Finished {} tasks in {:.0f}s".format(n_tasks, time.time() - start_time))
+    if n_failed > 0:
+        print("Warning. {} tasks failed. They are recorded in {}".format(n_failed, failed_tasks_file_path))
 
-                
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute features by using pflacco')
+    parser.add_argument('--mode', choices=['sequential', 'multiprocessing', 'torque'], default='sequential', help="'sequential' and 'multiprocessing' run all the tasks on this machine. 'torque' runs the tasks for a single (feature class, dimension, function) as a job thrown by throw_job_fc.py")
+    parser.add_argument('--n_workers', type=int, default=os.cpu_count(), help="The number of worker processes for the 'multiprocessing' mode")
+    parser.add_argument('--resume', action='store_true', help='Skip tasks whose feature files already exist')
+    parser.add_argument('--sample_format', choices=sample_formats, default='npy', help='The format of the sample files created by sample.py')
+    parser.add_argument('--no_single_pass', action='store_true', help='Load each sample file once per feature class, instead of once for all the feature classes')
+    parser.add_argument('--pca_solver', choices=pca_solvers, default='auto', help="The solver for the weighted PCA. 'auto' selects the full SVD or the eigen-decomposition of the covariance matrix based on the sample size, the dimension, and the number of components")
+    parser.add_argument('--feature_classes', nargs='+', choices=ela_feature_class_names, default=['basic', 'ela_distr', 'pca', 'limo', 'ic', 'disp', 'nbc', 'ela_level', 'ela_meta'], help="The feature classes computed in the 'sequential' and 'multiprocessing' modes, e.g., 'cm_angle cm_conv cm_grad' for the cell mapping classes")
+    parser.add_argument('--pca_classes', nargs='*', choices=ela_feature_class_names, default=default_pca_classes, help="The feature classes computed after the weighted PCA. The others are computed on the original sample")
+    parser.add_argument('--native_classes', nargs='*', choices=native_feature_classes, default=[], help='The feature classes computed by native_features.py without R')
+    parser.add_argument('--native_memory_budget', type=int, default=2**28, help="The memory budget (bytes) for the blocks of the pairwise distances in native_features.py ('nbc', 'disp', and 'cm_conv')")
+    parser.add_argument('--native_threads', type=int, default=1, help="The number of threads for the blocks of the pairwise distances in native_features.py. With multiple workers, the product of this and '--n_workers' should not exceed the number of cores")
+    parser.add_argument('--cache', action='store_true', help='Skip tasks whose feature files are up to date according to the manifest of pipeline_cache.py')
+    parser.add_argument('--manifest_file_path', default=default_manifest_file_path, help="The manifest file for '--cache'")
+    parser.add_argument('--instrument_file_path', default=None, help='Time each phase of each task and append the records to this JSONL file. The records can be summarized by instrumentation.py')
+    parser.add_argument('--cprofile', nargs='*', default=[], help="Profile the tasks matching these patterns 'class:dim:fun:instance' (e.g., 'nbc:640') by cProfile")
+    parser.add_argument('--cprofile_dir_path', default='./cprofile', help="The directory for the cProfile results")
+    parser.add_argument('--timeout', type=float, default=None, help='Abort a task group (all the feature classes for a sample file in the single pass, or a single feature class with --no_single_pass) after this number of seconds. The feature files written before the abort are kept')
+    parser.add_argument('--max_tasks_per_worker', type=int, default=None, help='Replace each worker by a new one after this number of tasks to cap the growth of the heap of R')
+    parser.add_argument('--failed_tasks_file_path', default='./failed_tasks.csv', help='The file where the failed tasks are recorded')
+    parser.add_argument('--n_pca_components', type=int, nargs='+', default=[2], help="The numbers of components m for the PCA, e.g., '2 3 5 10'. The weighted PCA is performed only once for each sample file, and the features are saved as 'tpca{m}_*' for each m")
+    parser.add_argument('--adaptive_classes', nargs='*', choices=ela_feature_class_names, default=[], help='The feature classes computed on nested subsamples of increasing size until their values converge')
+    parser.add_argument('--adaptive_multipliers', type=int, nargs='+', default=[10, 20, 40], help="The sizes of the subsamples for '--adaptive_classes' divided by the dimension. The full sample is used last")
+    parser.add_argument('--adaptive_tol', type=float, default=0.05, help="The tolerance of the maximum relative change of the features between two subsamples for '--adaptive_classes'")
+    parser.add_argument('--plan_file_path', default=None, help="Compute only the feature classes chosen for each dimension by feature_planner.py")
+    parser.add_argument('--feature_class', help="The feature class for the 'torque' mode")
+    parser.add_argument('--dim', type=int, help="The dimension for the 'torque' mode")
+    parser.add_argument('--fun_id', type=int, help="The function ID for the 'torque' mode")
+    args = parser.parse_args()
+
     # Compute features by using pflacco
     sample_method = 'lhs_multiplier50_sid0'
     sample_dir_path = os.path.join('./sample_data', sample_method)
+    feature_dir_path = os.path.join('./ela_feature_dataset', sample_method)
+    n_pca_components = args.n_pca_components
+    cache = None
+    if args.cache:
+        cache = PipelineCache(args.manifest_file_path)
 
-    run_by_torque = False
-    
-    # Example 1. A sequential approach    
-    if run_by_torque == False:
-        all_feature_classes = ['basic', 'ela_distr', 'pca', 'limo', 'ic', 'disp', 'nbc', 'ela_level', 'ela_meta']
-        #all_feature_classes = ['cm_angle', 'cm_conv', 'cm_grad', 'gcm']
-        n_pca_components = 2
-
-        for ela_feature_class in all_feature_classes:
-            dim_redu = 'none'
-            # Only for 'ela_level' and 'ela_meta', dimensionality reduction is performed
-            # If you want to compute the 'ela_level' and 'ela_meta' features as is, please comment out the following three lines:
-            if ela_feature_class in ['ela_level', 'ela_meta']:
-            #if ela_feature_class in ['cm_angle', 'cm_conv', 'cm_grad', 'gcm']:
-                dim_redu = 'pca'
-
-            for dim in [2, 3, 5, 10, 20, 40, 80, 160, 320, 640]:
-                bbob_suite = 'bbob'
-                if dim >= 20:
-                    bbob_suite = 'bbob-largescale'
-
-                for fun_id in range(1, 24+1):
-                    for instance_id in range(1, 15+1):                    
-                        sample_data_file_path = os.path.join(sample_dir_path, 'x_f_data_{}_f{}_DIM{}_i{}.csv'.format(bbob_suite, fun_id, dim, instance_id))
-                        feature_dir_path = os.path.join('./ela_feature_dataset', sample_method)                    
-                        os.makedirs(feature_dir_path, exist_ok=True)
-                        feature_file_path = os.path.join(feature_dir_path, '{}_{}_f{}_DIM{}_i{}.csv'.format(ela_feature_class, bbob_suite, fun_id, dim, instance_id))
-                        if dim_redu == 'pca':
-                            feature_file_path = os.path.join(feature_dir_path, 'tpca{}_{}_{}_f{}_DIM{}_i{}.csv'.format(n_pca_components, ela_feature_class, bbob_suite, fun_id, dim, instance_id))
-
-                        compute_features(ela_feature_class, sample_data_file_path, feature_file_path, dim_redu, n_pca_components)
-                        print("Done: Feature={}, dimension={},  f={}, instance ID={}".format(ela_feature_class, dim, fun_id, instance_id))                    
-    else:
-        # Example 2. A pseudo parallel approach    
-        ela_feature_class = sys.argv[1]
-        dim = int(sys.argv[2])
-        fun_id = int(sys.argv[3])
-        #dim_redu = sys.argv[4]
-        #n_pca_components = int(sys.argv[5])
-        n_pca_components = 2
-
-        dim_redu = 'none'
-        # Only for 'ela_level' and 'ela_meta', dimensionality reduction is performed
-        # If you want to compute the 'ela_level' and 'ela_meta' features as is, please comment out the following three lines:
-        if ela_feature_class in ['ela_level', 'ela_meta']:
-            #if ela_feature_class in ['cm_angle', 'cm_conv', 'cm_grad', 'gcm']:
-            dim_redu = 'pca'
-
-        bbob_suite = 'bbob'
-        if dim >= 20:
-            bbob_suite = 'bbob-largescale'
-
-        for instance_id in range(1, 15+1):                    
-            sample_data_file_path = os.path.join(sample_dir_path, 'x_f_data_{}_f{}_DIM{}_i{}.csv'.format(bbob_suite, fun_id, dim, instance_id))
-
-            feature_dir_path = os.path.join('./ela_feature_dataset', sample_method)                    
-            os.makedirs(feature_dir_path, exist_ok=True)
-            feature_file_path = os.path.join(feature_dir_path, '{}_{}_f{}_DIM{}_i{}.csv'.format(ela_feature_class, bbob_suite, fun_id, dim, instance_id))
-            if dim_redu == 'pca':
-                feature_file_path = os.path.join(feature_dir_path, 'tpca{}_{}_{}_f{}_DIM{}_i{}.csv'.format(n_pca_components, ela_feature_class, bbob_suite, fun_id, dim, instance_id))
+    if args.mode in ['sequential', 'multiprocessing']:
+        # Example 1. A sequential approach or a parallel approach by multiprocessing
+        all_feature_classes = args.feature_classes
+        dims = [2, 3, 5, 10, 20, 40, 80, 160, 320, 640]
+        if args.plan_file_path is None:
+            tasks = create_tasks(all_feature_classes, dims, range(1, 24+1), range(1, 15+1), sample_dir_path, feature_dir_path, n_pca_components, args.sample_format, args.pca_classes)
+        else:
+            tasks = create_tasks_from_plan(read_plan(args.plan_file_path), all_feature_classes, dims, range(1, 24+1), range(1, 15+1), sample_dir_path, feature_dir_path, n_pca_components, args.sample_format, args.pca_classes)
 
-            compute_features(ela_feature_class, sample_data_file_path, feature_file_path, dim_redu=dim_redu, n_pca_components=n_pca_components)
-            print("Done: Feature={}, dimension={},  f={}, instance ID={}".format(ela_feature_class, dim, fun_id, instance_id))
-        
+        n_workers = 1
+        if args.mode == 'multiprocessing':
+            n_workers = args.n_workers
+        run_tasks(tasks, n_workers=n_workers, resume=args.resume, single_pass=not args.no_single_pass, pca_solver=args.pca_solver, native_classes=args.native_classes, cache=cache, instrument_file_path=args.instrument_file_path, cprofile_patterns=args.cprofile, cprofile_dir_path=args.cprofile_dir_path, timeout=args.timeout, max_tasks_per_worker=args.max_tasks_per_worker, failed_tasks_file_path=args.failed_tasks_file_path, adaptive_classes=args.adaptive_classes, adaptive_multipliers=args.adaptive_multipliers, adaptive_tol=args.adaptive_tol, native_memory_budget=args.native_memory_budget, native_n_threads=args.native_threads)
+    else:
+        # Example 2. A pseudo parallel approach by Torque
+        tasks = create_tasks([args.feature_class], [args.dim], [args.fun_id], range(1, 15+1), sample_dir_path, feature_dir_path, n_pca_components, args.sample_format, args.pca_classes)
+        run_tasks(tasks, n_workers=1, resume=args.resume, single_pass=not args.no_single_pass, pca_solver=args.pca_solver, native_classes=args.native_classes, cache=cache, instrument_file_path=args.instrument_file_path, cprofile_patterns=args.cprofile, cprofile_dir_path=args.cprofile_dir_path, timeout=args.timeout, max_tasks_per_worker=args.max_tasks_per_worker, failed_tasks_file_path=args.failed_tasks_file_path, adaptive_classes=args.adaptive_classes, adaptive_multipliers=args.adaptive_multipliers, adaptive_tol=args.adaptive_tol, native_memory_budget=args.native_memory_budget, native_n_threads=args.native_threads)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+import numpy as np
+import pandas as pd
+import argparse
+import multiprocessing
+import json
+import os
+from property_classification import problem_info_columns, high_level_prop_labels, clean_table, fit_lopo_fold
+
+# A planner that chooses the feature classes to be computed for each dimension.
+# The feature classes are removed one by one from the full set in ascending order of their importance per second, where the importance of a feature class is the sum of the importances of its features in the random forests of the LOPO-CV, and the cost is the median computation time of the feature class for a function instance.
+# A removal is accepted only if the LOPO-CV accuracy averaged over the targets does not fall below that of the full set by more than "tol". Otherwise, the feature class is kept and the next one is tried. The accuracy of each target is not used for the decision, since it changes by 1/24 when the prediction for a single left-out function changes, but it is recorded in the plan. This is a greedy search, so the resulting subset is not necessarily the cheapest one.
+# The plan is saved as a JSON file, and feature_computation.py computes only the feature classes in it with "--plan_file_path".
+
+# The names of the feature classes in the table, e.g., 'nbc' and 'tpca2_ela_meta'. The name of each feature column starts with the name of its feature class.
+def get_table_classes(table_df):
+    table_classes = []
+    for column in table_df.columns:
+        if column in problem_info_columns + high_level_prop_labels:
+            continue
+        table_class = column.split('.')[0]
+        if table_class not in table_classes:
+            table_classes.append(table_class)
+    return table_classes
+
+# Split the name of a feature class in the table into the name of the feature class in flacco and the number of PCA components m, e.g., 'tpca2_ela_meta' -> ('ela_meta', 2) and 'nbc' -> ('nbc', None)
+def split_table_class(table_class):
+    if table_class.startswith('tpca'):
+        prefix, ela_feature_class = table_class.split('_', 1)
+        return ela_feature_class, int(prefix[len('tpca'):])
+    return table_class, None
+
+# Return the cost (seconds) of each pair of a feature class and a dimension.
+# By default, the cost is the median of the 'costs_runtime' feature in the table. If "cost_file_path" is given, the cost is replaced by the median of the measured times in it: the wall times of the 'feature' stage in the results of benchmark.py (for the largest sample multiplier) or the sum of the wall times of the feature object creation and the feature computation for each task in the records of instrumentation.py (.jsonl).
+# The measured times include the time that flacco does not count, e.g., the transfer of the sample to R. The time of the weighted PCA is shared by the feature classes, so it is not included.
+def read_class_costs(table_df, table_classes, dims, cost_file_path=None):
+    costs = {}
+    for dim in dims:
+        dim_df = table_df[table_df['dim'] == dim]
+        for table_class in table_classes:
+            column = '{}.costs_runtime'.format(table_class)
+            if column in dim_df.columns:
+                costs[(table_class, dim)] = float(dim_df[column].median())
+    if cost_file_path is None:
+        return costs
+
+    if cost_file_path.endswith('.jsonl'):
+        records_df = pd.read_json(cost_file_path, lines=True)
+        records_df = records_df[records_df['phase'].isin(['create_feature_object', 'calculate']) & records_df['feature_class'].notna()]
+        # The times of a sweep over the numbers of PCA components m are separated by m (0 for the feature classes without the PCA). The records written without m only give the costs of the feature classes without the PCA.
+        if 'm' not in records_df.columns:
+            records_df = records_df.assign(m=np.nan)
+        records_df = records_df.assign(m=records_df['m'].fillna(0).astype(int))
+        task_times = records_df.groupby(['feature_class', 'dim_redu', 'm', 'dim', 'fun', 'instance'])['wall_time'].sum()
+        measured_times = task_times.groupby(level=['feature_class', 'dim_redu', 'm', 'dim']).median()
+    else:
+        results_df = pd.read_csv(cost_file_path, header=0)
+        results_df = results_df[(results_df['stage'] == 'feature') & (results_df['multiplier'] == results_df['multiplier'].max())]
+        # benchmark.py appends the PCA solver to the backend of the feature classes with the PCA, e.g., 'pflacco_full'. Since benchmark.py uses a single m, the times of the feature classes with the PCA are used for all the numbers of components.
+        results_df = results_df.assign(dim_redu=np.where(results_df['backend'].str.contains('_'), 'pca', 'none'))
+        measured_times = results_df.groupby(['feature_class', 'dim_redu', 'dim'])['wall_time'].median()
+
+    n_measured = 0
+    for table_class in table_classes:
+        ela_feature_class, n_pca_components = split_table_class(table_class)
+        for dim in dims:
+            key = (ela_feature_class, 'pca' if n_pca_components is not None else 'none', int(dim))
+            if 'm' in measured_times.index.names:
+                key = (ela_feature_class, key[1], n_pca_components or 0, int(dim))
+            if key in measured_times.index:
+                costs[(table_class, dim)] = float(measured_times[key])
+                n_measured += 1
+    print("{} of {} costs were measured in {}".format(n_measured, len(table_classes) * len(dims), cost_file_path))
+    return costs
+
+def run_plan_fold(args):
+    table_df, left_fun_id, target_label, n_estimators = args
+    return (target_label,) + fit_lopo_fold(table_df, left_fun_id, target_label, 1, n_estimators)
+
+# Perform the LOPO-CV only with the features in "table_classes". Return the accuracy of each target (averaged over the left-out functions) and the importance of each feature class (averaged over all the folds).
+def evaluate_classes(table_df, table_classes, fun_ids, target_labels, n_workers=1, n_estimators=1000):
+    feature_columns = [c for c in table_df.columns if c not in problem_info_columns + high_level_prop_labels and c.split('.')[0] in table_classes]
+    table_df = table_df[problem_info_columns + high_level_prop_labels + feature_columns]
+    tasks = [(table_df, left_fun_id, target_label, n_estimators) for target_label in target_labels for left_fun_id in fun_ids]
+    if n_workers > 1:
+        with multiprocessing.Pool(processes=n_workers) as pool:
+            results = pool.map(run_plan_fold, tasks, chunksize=1)
+    else:
+        results = list(map(run_plan_fold, tasks))
+
+    accuracies = {target_label: np.mean([score for label, score, _, _ in results if label == target_label]) for target_label in target_labels}
+    importances = {table_class: 0. for table_class in table_classes}
+    for _, _, feature_names, feature_importances in results:
+        for name, importance in zip(feature_names, feature_importances):
+            importances[name.split('.')[0]] += importance / len(results)
+    return accuracies, importances
+
+def plan_dim(table_df, dim, costs, fun_ids, target_labels, tol=0.01, n_workers=1, n_estimators=1000):
+    all_table_classes = get_table_classes(table_df)
+    table_df = clean_table(table_df, dim)
+    # The feature classes whose features are all removed by clean_table (e.g., all NaN) are useless
+    table_classes = get_table_classes(table_df)
+    class_costs = {table_class: costs.get((table_class, dim), np.nan) for table_class in all_table_classes}
+    unknown_cost_classes = [table_class for table_class in all_table_classes if np.isnan(class_costs[table_class])]
+    if len(unknown_cost_classes) > 0:
+        print("Warning. Dimension={}: the costs of {} are unknown. They are tried last and are not included in the total costs".format(dim, ', '.join(unknown_cost_classes)))
+
+    full_accuracies, importances = evaluate_classes(table_df, table_classes, fun_ids, target_labels, n_workers, n_estimators)
+    print("Dimension={}: the accuracy of the full set={:.4f}".format(dim, np.mean(list(full_accuracies.values()))))
+
+    selected_classes = list(table_classes)
+    accuracies = full_accuracies
+    tried_classes = []
+    while len(selected_classes) > 1:
+        candidates = [table_class for table_class in selected_classes if table_class not in tried_classes]
+        if len(candidates) == 0:
+            break
+        # A feature class with an unknown cost is tried last
+        candidate = min(candidates, key=lambda table_class: importances[table_class] / max(np.nan_to_num(class_costs[table_class]), 1e-6))
+        tried_classes.append(candidate)
+
+        new_classes = [table_class for table_class in selected_classes if table_class != candidate]
+        new_accuracies, new_importances = evaluate_classes(table_df, new_classes, fun_ids, target_labels, n_workers, n_estimators)
+        drop = np.mean(list(full_accuracies.values())) - np.mean(list(new_accuracies.values()))
+        accepted = drop <= tol
+        print("Dimension={}: without {} (cost={:.3g}s, importance={:.3g}): the accuracy drop={:.4f}, {}".format(dim, candidate, class_costs[candidate], importances[candidate], drop, 'removed' if accepted else 'kept'))
+        if accepted:
+            selected_classes = new_classes
+            accuracies = new_accuracies
+            importances.update(new_importances)
+
+    selected_classes = [table_class for table_class in all_table_classes if table_class in selected_classes]
+    return {'classes': selected_classes,
+            'removed_classes': [table_class for table_class in all_table_classes if table_class not in selected_classes],
+            'cost_full': float(np.nansum([class_costs[c] for c in all_table_classes])),
+            'cost_plan': float(np.nansum([class_costs[c] for c in selected_classes])),
+            'accuracy_full': full_accuracies,
+            'accuracy_plan': accuracies,
+            'class_costs': class_costs,
+            'unknown_cost_classes': unknown_cost_classes,
+            'class_importances': importances}
+
+def create_plan(plan_file_path, table_data_file_path, dims, fun_ids, target_labels, tol=0.01, cost_file_path=None, n_workers=1, n_estimators=1000):
+    table_df = pd.read_csv(table_data_file_path, header=0)
+    dims = [dim for dim in dims if dim in set(table_df['dim'])]
+    costs = read_class_costs(table_df, get_table_classes(table_df), dims, cost_file_path)
+
+    plan = {'table_data_file_path': table_data_file_path, 'cost_file_path': cost_file_path, 'tol': tol, 'n_estimators': n_estimators, 'dims': {}}
+    for dim in dims:
+        plan['dims'][str(dim)] = plan_dim(table_df, dim, costs, fun_ids, target_labels, tol, n_workers, n_estimators)
+        dim_plan = plan['dims'][str(dim)]
+        print("Dimension={}: {} (cost {:.3g}s -> {:.3g}s)".format(dim, ', '.join(dim_plan['classes']), dim_plan['cost_full'], dim_plan['cost_plan']))
+
+    with open(plan_file_path, 'w') as fh:
+        json.dump(plan, fh, indent=1)
+    return plan
+
+# Return the names of the feature classes in the table for each dimension in the plan
+def read_plan(plan_file_path):
+    with open(plan_file_path, 'r') as fh:
+        plan = json.load(fh)
+    return {int(dim): dim_plan['classes'] for dim, dim_plan in plan['dims'].items()}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Choose the feature classes to be computed for each dimension based on their costs and their importances in the classification')
+    parser.add_argument('--table_data_file_path', default='./feature_table_data/lhs_multiplier50_sid0_basic_ela_distr_pca_limo_ic_disp_nbc_tpca2_ela_level_tpca2_ela_meta_dims3_5_10_20_40_80_160_320_640.csv')
+    parser.add_argument('--plan_file_path', default='./feature_plan.json')
+    parser.add_argument('--cost_file_path', default=None, help="The results of benchmark.py (.csv) or the records of instrumentation.py (.jsonl). By default, the 'costs_runtime' features in the table are used")
+    parser.add_argument('--tol', type=float, default=0.01, help='The largest acceptable drop of the accuracy averaged over the targets from the full set')
+    parser.add_argument('--dims', type=int, nargs='+', default=[3, 5, 10, 20, 40, 80, 160, 320, 640])
+    parser.add_argument('--n_estimators', type=int, default=1000, help='The number of trees in each random forest')
+    parser.add_argument('--n_workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    create_plan(args.plan_file_path, args.table_data_file_path, args.dims, range(1, 24+1), high_level_prop_labels, args.tol, args.cost_file_path, args.n_workers, args.n_estimators)
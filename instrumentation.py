@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+import pandas as pd
+import contextlib
+import argparse
+import resource
+import time
+import json
+import os
+
+# Opt-in instrumentation of the phases of a feature computation task (loading, scale_X, PCA fit, feature object creation, feature computation, and writing).
+# Each phase produces a record tagged with the task. The records are written as JSON lines by feature_computation.py.
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm', 'r') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        # Only the peak RSS is available on systems without /proc
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class PhaseProfile:
+    # If "enabled" is False, phase() does nothing, so the instrumentation costs nothing when it is not used
+    def __init__(self, tags={}, enabled=True):
+        self.tags = tags
+        self.enabled = enabled
+        self.records = []
+
+    # Time the phase in the with statement. The caller can add information (e.g., array sizes) to the yielded dictionary.
+    @contextlib.contextmanager
+    def phase(self, name, **info):
+        if not self.enabled:
+            yield info
+            return
+
+        rss_before = current_rss_mb()
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        yield info
+        record = dict(self.tags)
+        record['phase'] = name
+        record['wall_time'] = time.perf_counter() - start_wall_time
+        record['cpu_time'] = time.process_time() - start_cpu_time
+        record['rss_mb'] = current_rss_mb()
+        record['rss_delta_mb'] = record['rss_mb'] - rss_before
+        record['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        record.update(info)
+        self.records.append(record)
+
+def write_records(records, jsonl_file_path):
+    with open(jsonl_file_path, 'a') as fh:
+        for record in records:
+            fh.write(json.dumps(record, default=str) + '\n')
+
+# A pattern "class:dim:fun:instance" selects the tasks to be profiled by cProfile. Each field can be '*', and the missing fields are regarded as '*', e.g., 'nbc:640' selects all the 'nbc' tasks with 640 dimensions.
+def match_task_pattern(pattern, ela_feature_class, dim, fun_id, instance_id):
+    fields = pattern.split(':')
+    fields += ['*'] * (4 - len(fields))
+    for field, value in zip(fields, [ela_feature_class, dim, fun_id, instance_id]):
+        if field != '*' and field != str(value):
+            return False
+    return True
+
+# Rank the (feature class, dimension) cells by their total wall time in the records. The phases shared by the feature classes for the same sample (loading, scale_X, and PCA fit) are shown as '(shared)'.
+def summarize_records(jsonl_file_path, top=20):
+    records_df = pd.read_json(jsonl_file_path, lines=True)
+    records_df['feature_class'] = records_df['feature_class'].fillna('(shared)')
+    phase_df = records_df.pivot_table(index=['feature_class', 'dim'], columns='phase', values='wall_time', aggfunc='sum', fill_value=0.)
+    phase_df['total'] = phase_df.sum(axis=1)
+    phase_df['max_rss_delta_mb'] = records_df.groupby(['feature_class', 'dim'])['rss_delta_mb'].max()
+    phase_df = phase_df.sort_values('total', ascending=False)
+    print(phase_df.head(top).to_string(float_format='{:.2f}'.format))
+    return phase_df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rank the (feature class, dimension) cells by the instrumentation records of feature_computation.py')
+    parser.add_argument('jsonl_file_path', nargs='?', default='./instrumentation.jsonl')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    summarize_records(args.jsonl_file_path, args.top)
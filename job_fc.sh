@@ -2,4 +2,4 @@
 
 cd $PBS_O_WORKDIR
 
-python feature_computation.py $arg1 $arg2 $arg3
+python feature_computation.py --mode torque --feature_class $arg1 --dim $arg2 --fun_id $arg3
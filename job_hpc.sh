@@ -2,4 +2,4 @@
 
 cd $PBS_O_WORKDIR
 
-python property_classification.py $arg1 $arg2 $arg3
+python property_classification.py --mode torque --target_label $arg1 --dim $arg2 --left_fun_id $arg3
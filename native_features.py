@@ -0,0 +1,732 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import time
+import itertools
+import concurrent.futures
+from scipy.spatial import cKDTree
+
+# A pure NumPy implementation of some feature classes in flacco (https://github.com/kerschke/flacco). Only the nearest neighbor searches in low dimensions use SciPy.
+# The 'nbc' and 'disp' classes are based on the chunked pairwise distances below, so that the peak memory does not grow quadratically with the sample size.
+# The cell mapping classes ('cm_angle', 'cm_conv', and 'cm_grad') index only the occupied cells, so that they can be computed even when the number of cells blocks^dim is huge.
+# The 'gcm' class is not implemented. Its features are those of a Markov chain over all the cells, and flacco defines the representative objective value of an empty cell, so a version over the occupied cells would be a different feature set. Moreover, 'gcm' exists only in the R version of flacco (not in the Python version of pflacco), so it could not be checked by check_parity without R.
+# The names of the features are the same as those returned by pflacco.calculate_feature_set.
+# Only the default control parameters of flacco are supported.
+native_feature_classes = ['basic', 'ela_distr', 'pca', 'limo', 'ela_meta', 'nbc', 'disp', 'cm_angle', 'cm_conv', 'cm_grad']
+
+# The counterpart of pflacco.create_feature_object
+def create_native_feature_object(x, y, minimize=True, lower=-5, upper=5, blocks=None):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    dim = len(x[0])
+
+    if blocks is None:
+        blocks = 1
+    blocks = np.full(dim, blocks, dtype=int)
+    lower = np.full(dim, lower, dtype=np.float64)
+    upper = np.full(dim, upper, dtype=np.float64)
+
+    # The coordinates of the cell that each point belongs to. The points on the upper bound belong to the last cell.
+    cell_coords = np.floor((x - lower) / (upper - lower) * blocks)
+    cell_coords = np.minimum(np.maximum(cell_coords, 0), blocks - 1).astype(np.min_scalar_type(np.max(blocks)))
+    # Only the occupied cells are indexed, since the number of all the cells (blocks^dim) can be astronomical. "cells" is the coordinates of the occupied cells, and "cell_ids" is the index of the cell of each point in "cells".
+    # The occupied cells are sorted in the same order as the cell IDs in flacco.
+    if np.max(blocks) == 1:
+        cells = np.zeros((1, dim), dtype=cell_coords.dtype)
+        cell_ids = np.zeros(len(x), dtype=int)
+    else:
+        cells, cell_ids = np.unique(cell_coords[:, ::-1], axis=0, return_inverse=True)
+        cells = np.ascontiguousarray(cells[:, ::-1])
+        cell_ids = cell_ids.reshape(-1)
+
+    return {'x': x, 'y': y, 'minimize': minimize, 'lower': lower, 'upper': upper, 'blocks': blocks, 'cells': cells, 'cell_ids': cell_ids}
+
+### Helper functions that reproduce the R functions used in flacco
+def r_sd(values):
+    if len(values) < 2:
+        return np.nan
+    return np.std(values, ddof=1)
+
+# e1071::skewness(type=3)
+def r_skewness(y):
+    y_ = y - np.mean(y)
+    return np.mean(y_ ** 3) / np.std(y, ddof=1) ** 3
+
+# e1071::kurtosis(type=3)
+def r_kurtosis(y):
+    y_ = y - np.mean(y)
+    return np.mean(y_ ** 4) / np.std(y, ddof=1) ** 4 - 3
+
+# The Brent's method in R (R_zeroin2), which is called by stats::uniroot
+def r_zeroin(f, ax, bx, fa, fb, tol, maxit=1000):
+    eps = np.finfo(float).eps
+    a, b = ax, bx
+    c, fc = a, fa
+    if fa == 0:
+        return a
+    if fb == 0:
+        return b
+    maxit += 1
+    while maxit > 0:
+        maxit -= 1
+        prev_step = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol_act = 2 * eps * abs(b) + tol / 2
+        new_step = (c - b) / 2
+        if abs(new_step) <= tol_act or fb == 0:
+            return b
+        if abs(prev_step) >= tol_act and abs(fa) > abs(fb):
+            cb = c - b
+            if a == c:
+                t1 = fb / fa
+                p = cb * t1
+                q = 1.0 - t1
+            else:
+                q = fa / fc
+                t1 = fb / fc
+                t2 = fb / fa
+                p = t2 * (cb * q * (q - t1) - (b - a) * (t1 - 1.0))
+                q = (q - 1.0) * (t1 - 1.0) * (t2 - 1.0)
+            if p > 0:
+                q = -q
+            else:
+                p = -p
+            if p < (0.75 * cb * q - abs(tol_act * q) / 2) and p < abs(prev_step * q / 2):
+                new_step = p / q
+        if abs(new_step) < tol_act:
+            if new_step > 0:
+                new_step = tol_act
+            else:
+                new_step = -tol_act
+        a, fa = b, fb
+        b += new_step
+        fb = f(b)
+        if (fb > 0 and fc > 0) or (fb < 0 and fc < 0):
+            c, fc = a, fa
+    return b
+
+# stats::bw.SJ(method='ste')
+def r_bw_sj(x, nb=1000):
+    n = len(x)
+    # Binned pairwise distances (C_bw_den). The number of pairs in each bin is obtained from the histogram of the bin indices.
+    dd = (np.max(x) - np.min(x)) * 1.01 / nb
+    bin_ids = np.trunc(x / dd).astype(np.int64)
+    bin_ids -= np.min(bin_ids)
+    hist = np.bincount(bin_ids).astype(np.float64)
+    cnt = np.zeros(nb)
+    n_lags = min(nb, len(hist))
+    cnt[0] = np.sum(hist * (hist - 1) / 2)
+    for k in range(1, n_lags):
+        cnt[k] = np.dot(hist[:-k], hist[k:])
+
+    def phi(h, order):
+        delta = (np.arange(nb) * dd / h) ** 2
+        # The bins with delta >= 1000 are ignored
+        valid = np.cumprod(delta < 1000).astype(bool)
+        delta = delta[valid]
+        if order == 4:
+            term = np.exp(-delta / 2) * (delta * delta - 6 * delta + 3)
+            s = 2 * np.sum(term * cnt[valid]) + n * 3
+        else:
+            term = np.exp(-delta / 2) * (delta * delta * delta - 15 * delta * delta + 45 * delta - 15)
+            s = 2 * np.sum(term * cnt[valid]) - 15 * n
+        return s / (n * (n - 1.) * h ** (order + 1.) * np.sqrt(2 * np.pi))
+
+    q75, q25 = np.percentile(x, [75, 25])
+    scale = min(np.std(x, ddof=1), (q75 - q25) / 1.349)
+    a = 1.24 * scale * n ** (-1 / 7)
+    b = 1.23 * scale * n ** (-1 / 9)
+    c1 = 1 / (2 * np.sqrt(np.pi) * n)
+    td = -phi(b, 6)
+    if not np.isfinite(td) or td <= 0:
+        raise Exception("Error: sample is too sparse to find TD")
+    alph2 = 1.357 * (phi(a, 4) / td) ** (1 / 7)
+
+    def fsd(h):
+        return (c1 / phi(alph2 * h ** (5 / 7), 4)) ** (1 / 5) - h
+
+    hmax = 1.144 * scale * n ** (-1 / 5)
+    lower = 0.1 * hmax
+    upper = hmax
+    tol = 0.1 * lower
+    itry = 1
+    while fsd(lower) * fsd(upper) > 0:
+        if itry > 99:
+            raise Exception("Error: no solution in the specified range of bandwidths")
+        if itry % 2:
+            upper *= 1.2
+        else:
+            lower /= 1.2
+        itry += 1
+    return r_zeroin(fsd, lower, upper, fsd(lower), fsd(upper), tol)
+
+# stats::density(bw='SJ') with the Gaussian kernel
+def r_density(x, n=512, cut=3):
+    bw = r_bw_sj(x)
+    start = np.min(x) - cut * bw
+    end = np.max(x) + cut * bw
+    lo = start - 4 * bw
+    up = end + 4 * bw
+
+    # Linear binning (C_BinDist) with the weight 1/len(x)
+    y = np.zeros(2 * n)
+    xdelta = (up - lo) / (n - 1)
+    xpos = (x - lo) / xdelta
+    ix = np.floor(xpos).astype(int)
+    fx = xpos - ix
+    w = 1. / len(x)
+    inner = (ix >= 0) & (ix <= n - 2)
+    np.add.at(y, ix[inner], w * (1 - fx[inner]))
+    np.add.at(y, ix[inner] + 1, w * fx[inner])
+    y[0] += np.sum(w * fx[ix == -1])
+    y[n - 1] += np.sum(w * (1 - fx[ix == n - 1]))
+
+    kords = np.linspace(0, 2 * (up - lo), 2 * n)
+    kords[n + 1:] = -kords[n - 1:0:-1]
+    kords = np.exp(-0.5 * (kords / bw) ** 2) / (np.sqrt(2 * np.pi) * bw)
+    kords = np.fft.ifft(np.fft.fft(y) * np.conj(np.fft.fft(kords)))
+    kords = np.maximum(0, np.real(kords)[:n])
+    xords = np.linspace(lo, up, n)
+    density_x = np.linspace(start, end, n)
+    return density_x, np.interp(density_x, xords, kords)
+
+def compute_number_of_peaks(y, modemass_threshold=0.01):
+    density_x, density_y = r_density(y)
+    n = len(density_y)
+    index = np.arange(1, n - 1)
+    is_min = (density_y[index] < density_y[index - 1]) & (density_y[index] < density_y[index + 1])
+    min_index = np.concatenate([[0], index[is_min], [n - 1]])
+    dx = density_x[1] - density_x[0]
+    modemass = [np.sum(density_y[min_index[i]:min_index[i + 1]]) * dx for i in range(len(min_index) - 1)]
+    return int(np.sum(np.array(modemass) > modemass_threshold))
+
+# Return a mask of the columns of A that are kept by the QR decomposition in stats::lm (LINPACK dqrdc2). The columns are examined in order, and a column is regarded as linearly dependent on the previous ones if the norm of its component orthogonal to them is at most "tol" times its norm.
+# At most n columns are kept, so the remaining columns are dependent when there are fewer rows than columns.
+def get_independent_columns(A, tol=1e-7):
+    n, p = A.shape
+    independent = np.zeros(p, dtype=bool)
+    basis = np.empty((n, 0))
+    for j in range(p):
+        if len(basis[0]) == n:
+            break
+        norm = np.linalg.norm(A[:, j])
+        if norm == 0:
+            continue
+        residual = A[:, j] - basis @ (basis.T @ A[:, j])
+        # The orthogonalization is repeated once for numerical stability
+        residual -= basis @ (basis.T @ residual)
+        residual_norm = np.linalg.norm(residual)
+        if residual_norm > tol * norm:
+            independent[j] = True
+            basis = np.hstack([basis, (residual / residual_norm).reshape(-1, 1)])
+    return independent
+
+# A linear regression model by the least squares method, which is the counterpart of stats::lm.
+# The coefficients of the linearly dependent terms are NaN, as in R. This is also the case for the terms that cannot be estimated since there are fewer points than terms.
+def fit_lm(X, y):
+    A = np.hstack([np.ones((len(X), 1)), X])
+    independent = get_independent_columns(A)
+    coefs = np.full(A.shape[1], np.nan)
+    coefs[independent] = np.linalg.lstsq(A[:, independent], y, rcond=None)[0]
+    rank = np.sum(independent)
+
+    fitted = A[:, independent] @ coefs[independent]
+    rss = np.sum((y - fitted) ** 2)
+    mss = np.sum((fitted - np.mean(fitted)) ** 2)
+    n = len(y)
+    # R^2 is NaN if y is constant, e.g., a single point in a cell
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = mss / (mss + rss)
+    adj_r2 = np.nan
+    if n > rank:
+        adj_r2 = 1 - (1 - r2) * ((n - 1.) / (n - rank))
+    return coefs, adj_r2
+
+def interaction_terms(X):
+    pairs = list(itertools.combinations(range(len(X[0])), 2))
+    if len(pairs) == 0:
+        return np.empty((len(X), 0))
+    return np.column_stack([X[:, i] * X[:, j] for i, j in pairs])
+
+### Chunked pairwise distances for the 'nbc', 'disp', and 'cm_conv' classes
+# The distance matrix is never stored as a whole. Instead, it is computed by blocks of rows whose size is bounded by "memory_budget" (bytes). The blocks can be processed by "n_threads" threads, since NumPy releases the GIL in the matrix multiplication.
+def get_chunk_size(n_rows, n_cols, memory_budget, n_threads=1):
+    # Each thread holds a few arrays with the shape (chunk size, n_cols)
+    return int(max(1, min(n_rows, memory_budget // (4 * 8 * n_cols * n_threads))))
+
+def map_chunks(fun, n_rows, chunk_size, n_threads=1):
+    chunks = [(start, min(start + chunk_size, n_rows)) for start in range(0, n_rows, chunk_size)]
+    if n_threads == 1:
+        return [fun(start, end) for start, end in chunks]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+        return list(executor.map(lambda chunk: fun(*chunk), chunks))
+
+def squared_distances(X, sq_norms, start, end):
+    D = sq_norms[start:end].reshape(-1, 1) + sq_norms.reshape(1, -1) - 2 * (X[start:end] @ X.T)
+    return np.maximum(D, 0)
+
+# For each point, return the distances to its nearest neighbor and its nearest better neighbor and the index of the latter.
+# The nearest better neighbor of the best point does not exist, so its distance and index are NaN and -1, respectively.
+def nearest_better_stats(X, y, memory_budget=2**28, n_threads=1):
+    n = len(X)
+    sq_norms = np.sum(X * X, axis=1)
+
+    def fun(start, end):
+        D = squared_distances(X, sq_norms, start, end)
+        D[np.arange(end - start), np.arange(start, end)] = np.inf
+        nn_ids = np.argmin(D, axis=1)
+        D[y.reshape(1, -1) >= y[start:end].reshape(-1, 1)] = np.inf
+        nb_ids = np.argmin(D, axis=1)
+        nb_ids[np.isinf(D[np.arange(end - start), nb_ids])] = -1
+        return nn_ids, nb_ids
+
+    results = map_chunks(fun, n, get_chunk_size(n, n, memory_budget, n_threads), n_threads)
+    nn_ids = np.concatenate([r[0] for r in results])
+    nb_ids = np.concatenate([r[1] for r in results])
+
+    # The distances are recomputed from the differences so that they are not affected by the cancellation in squared_distances
+    nn_dists = np.sqrt(np.sum((X - X[nn_ids]) ** 2, axis=1))
+    has_nb = nb_ids >= 0
+    nb_dists = np.full(n, np.nan)
+    nb_dists[has_nb] = np.sqrt(np.sum((X[has_nb] - X[nb_ids[has_nb]]) ** 2, axis=1))
+    return nn_dists, nb_dists, nb_ids
+
+# For each query point in Q, return the index of its nearest point in X. A k-d tree is used only in low dimensions, where it is faster than the chunked distances.
+def nearest_point_ids(X, Q, memory_budget=2**28, n_threads=1):
+    if len(X[0]) <= 10:
+        return cKDTree(X).query(Q, workers=n_threads)[1]
+    sq_norms = np.sum(X * X, axis=1)
+
+    def fun(start, end):
+        D = sq_norms.reshape(1, -1) - 2 * (Q[start:end] @ X.T)
+        return np.argmin(D, axis=1)
+
+    return np.concatenate(map_chunks(fun, len(Q), get_chunk_size(len(Q), len(X), memory_budget, n_threads), n_threads))
+
+# Return the mean and the median of all the pairwise distances in X, as mean(dist(X)) and median(dist(X)) in R.
+# If all the distances do not fit in "memory_budget", the median is found exactly by narrowing down a histogram of the distances over multiple passes.
+def pairwise_distance_mean_median(X, memory_budget=2**28, n_threads=1, n_bins=2**16):
+    n = len(X)
+    n_pairs = n * (n - 1) // 2
+    sq_norms = np.sum(X * X, axis=1)
+    chunk_size = get_chunk_size(n, n, memory_budget, n_threads)
+
+    def upper_distances(start, end):
+        D = np.sqrt(squared_distances(X, sq_norms, start, end))
+        mask = np.arange(n).reshape(1, -1) > np.arange(start, end).reshape(-1, 1)
+        return D[mask]
+
+    if n_pairs * 8 <= memory_budget:
+        dists = np.concatenate(map_chunks(upper_distances, n, chunk_size, n_threads))
+        return np.mean(dists), np.median(dists)
+
+    # The k-th smallest distances (0-origin) that determine the median
+    ranks = sorted(set([(n_pairs - 1) // 2, n_pairs // 2]))
+    values = []
+    total = 0.
+    for rank in ranks:
+        lo = 0.
+        hi = np.sqrt(np.sum((np.max(X, axis=0) - np.min(X, axis=0)) ** 2)) * (1 + 1e-9) + 1e-300
+        n_below = 0
+        while True:
+            def hist(start, end):
+                dists = upper_distances(start, end)
+                in_range = dists[(dists >= lo) & (dists < hi)]
+                return np.sum(dists), np.histogram(in_range, bins=n_bins, range=(lo, hi))[0]
+            results = map_chunks(hist, n, chunk_size, n_threads)
+            total = sum([r[0] for r in results])
+            counts = np.sum([r[1] for r in results], axis=0)
+            cum_counts = n_below + np.cumsum(counts)
+            bin_id = np.searchsorted(cum_counts, rank, side='right')
+            edges = np.linspace(lo, hi, n_bins + 1)
+            if bin_id > 0:
+                n_below = cum_counts[bin_id - 1]
+            lo, hi = edges[bin_id], edges[bin_id + 1]
+            if counts[bin_id] * 8 <= memory_budget or hi - lo <= 2 * np.finfo(float).eps * hi:
+                break
+
+        def collect(start, end):
+            dists = upper_distances(start, end)
+            return dists[(dists >= lo) & (dists < hi)]
+        candidates = np.sort(np.concatenate(map_chunks(collect, n, chunk_size, n_threads)))
+        values.append(candidates[rank - n_below])
+
+    return total / n_pairs, np.mean(values)
+
+### Feature classes
+def calculate_basic(feat_object):
+    x = feat_object['x']
+    y = feat_object['y']
+    blocks = feat_object['blocks']
+    return {'basic.dim': len(x[0]),
+            'basic.observations': len(x),
+            'basic.lower_min': np.min(feat_object['lower']),
+            'basic.lower_max': np.max(feat_object['lower']),
+            'basic.upper_min': np.min(feat_object['upper']),
+            'basic.upper_max': np.max(feat_object['upper']),
+            'basic.objective_min': np.min(y),
+            'basic.objective_max': np.max(y),
+            'basic.blocks_min': np.min(blocks),
+            'basic.blocks_max': np.max(blocks),
+            'basic.cells_total': int(np.prod(blocks.astype(float))),
+            'basic.cells_filled': len(np.unique(feat_object['cell_ids'])),
+            # The cell mapping is set up only if the number of blocks is given, as in flacco
+            'basic.allows_cm': bool(np.max(blocks) > 1),
+            'basic.minimize_fun': feat_object['minimize']}
+
+def calculate_ela_distr(feat_object):
+    y = feat_object['y']
+    return {'ela_distr.skewness': r_skewness(y),
+            'ela_distr.kurtosis': r_kurtosis(y),
+            'ela_distr.number_of_peaks': compute_number_of_peaks(y)}
+
+def calculate_pca(feat_object, prop=0.9):
+    x = feat_object['x']
+    init = np.hstack([x, feat_object['y'].reshape(-1, 1)])
+    feature_dict = {}
+    eigen_values = {}
+    for key, data in [('cov_x', x), ('cor_x', x), ('cov_init', init), ('cor_init', init)]:
+        if key.startswith('cov'):
+            mat = np.atleast_2d(np.cov(data, rowvar=False))
+        else:
+            mat = np.atleast_2d(np.corrcoef(data, rowvar=False))
+        eigen_values[key] = np.sort(np.linalg.eigvalsh(mat))[::-1]
+    for key in ['cov_x', 'cor_x', 'cov_init', 'cor_init']:
+        ev = eigen_values[key]
+        expl_var = np.cumsum(ev) / np.sum(ev)
+        feature_dict['pca.expl_var.{}'.format(key)] = (np.argmax(expl_var >= prop) + 1) / len(ev)
+    for key in ['cov_x', 'cor_x', 'cov_init', 'cor_init']:
+        ev = eigen_values[key]
+        feature_dict['pca.expl_var_PC1.{}'.format(key)] = ev[0] / np.sum(ev)
+    return feature_dict
+
+def calculate_limo(feat_object):
+    x = feat_object['x']
+    y = feat_object['y']
+    cell_ids = feat_object['cell_ids']
+
+    coeff_vect = []
+    for cell_id in np.unique(cell_ids):
+        in_cell = cell_ids == cell_id
+        coefs, _ = fit_lm(x[in_cell], y[in_cell])
+        coeff_vect.append(coefs[1:])
+    coeff_vect = np.array(coeff_vect)
+
+    length_reg = np.sqrt(np.sum(coeff_vect ** 2, axis=1))
+    coeff_vect_norm = coeff_vect / length_reg.reshape(-1, 1)
+    abs_coeff = np.abs(coeff_vect)
+    ratio = np.max(abs_coeff, axis=1) / np.min(abs_coeff, axis=1)
+    sds_reg = np.array([r_sd(c) for c in coeff_vect.T])
+    sds_norm = np.array([r_sd(c) for c in coeff_vect_norm.T])
+
+    def mean_cor(mat):
+        if len(mat) < 2:
+            return np.nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cor = np.corrcoef(mat, rowvar=False)
+        return np.mean(cor[np.triu_indices(len(cor), k=1)])
+
+    return {'limo.avg_length.reg': np.sqrt(np.sum(np.mean(coeff_vect, axis=0) ** 2)),
+            'limo.avg_length.norm': np.sqrt(np.sum(np.mean(coeff_vect_norm, axis=0) ** 2)),
+            'limo.length_mean': np.mean(length_reg),
+            'limo.length_sd': r_sd(length_reg),
+            'limo.cor.reg': mean_cor(coeff_vect),
+            'limo.cor.norm': mean_cor(coeff_vect_norm),
+            'limo.ratio_mean': np.mean(ratio),
+            'limo.ratio_sd': r_sd(ratio),
+            'limo.sd_ratio.reg': np.max(sds_reg) / np.min(sds_reg),
+            'limo.sd_ratio.norm': np.max(sds_norm) / np.min(sds_norm),
+            'limo.sd_mean.reg': np.mean(sds_reg),
+            'limo.sd_mean.norm': np.mean(sds_norm)}
+
+def calculate_ela_meta(feat_object):
+    x = feat_object['x']
+    y = feat_object['y']
+    dim = len(x[0])
+
+    lin_simple_coefs, lin_simple_adj_r2 = fit_lm(x, y)
+    _, lin_w_interact_adj_r2 = fit_lm(np.hstack([x, interaction_terms(x)]), y)
+    quad_simple_coefs, quad_simple_adj_r2 = fit_lm(np.hstack([x, x * x]), y)
+    _, quad_w_interact_adj_r2 = fit_lm(np.hstack([x, x * x, interaction_terms(x)]), y)
+
+    lin_coefs = np.abs(lin_simple_coefs[1:])
+    quad_coefs = np.abs(quad_simple_coefs[dim + 1:])
+    return {'ela_meta.lin_simple.adj_r2': lin_simple_adj_r2,
+            'ela_meta.lin_simple.intercept': lin_simple_coefs[0],
+            'ela_meta.lin_simple.coef.min': np.min(lin_coefs),
+            'ela_meta.lin_simple.coef.max': np.max(lin_coefs),
+            'ela_meta.lin_simple.coef.max_by_min': np.max(lin_coefs) / np.min(lin_coefs),
+            'ela_meta.lin_w_interact.adj_r2': lin_w_interact_adj_r2,
+            'ela_meta.quad_simple.adj_r2': quad_simple_adj_r2,
+            'ela_meta.quad_simple.cond': np.max(quad_coefs) / np.min(quad_coefs),
+            'ela_meta.quad_w_interact.adj_r2': quad_w_interact_adj_r2}
+
+def pearson_cor(a, b):
+    valid = ~(np.isnan(a) | np.isnan(b))
+    if np.sum(valid) < 2:
+        return np.nan
+    a, b = a[valid], b[valid]
+    if np.std(a) == 0 or np.std(b) == 0:
+        return np.nan
+    return np.corrcoef(a, b)[0, 1]
+
+def calculate_nbc(feat_object, memory_budget=2**28, n_threads=1):
+    x = feat_object['x']
+    y = feat_object['y']
+    if not feat_object['minimize']:
+        y = -y
+
+    nn_dists, nb_dists, nb_ids = nearest_better_stats(x, y, memory_budget, n_threads)
+    # The number of points whose nearest better neighbor is each point
+    to_me_count = np.bincount(nb_ids[nb_ids >= 0], minlength=len(x)).astype(np.float64)
+    has_nb = ~np.isnan(nb_dists)
+    dist_ratio = nn_dists[has_nb] / nb_dists[has_nb]
+
+    return {'nbc.nn_nb.sd_ratio': r_sd(nn_dists[has_nb]) / r_sd(nb_dists[has_nb]),
+            'nbc.nn_nb.mean_ratio': np.mean(nn_dists[has_nb]) / np.mean(nb_dists[has_nb]),
+            'nbc.nn_nb.cor': pearson_cor(nn_dists, nb_dists),
+            'nbc.dist_ratio.coeff_var': r_sd(dist_ratio) / np.mean(dist_ratio),
+            'nbc.nb_fitness.cor': pearson_cor(to_me_count, y)}
+
+def calculate_disp(feat_object, quantiles=[0.02, 0.05, 0.1, 0.25], memory_budget=2**28, n_threads=1):
+    x = feat_object['x']
+    y = feat_object['y']
+    if not feat_object['minimize']:
+        y = -y
+
+    mean_full, median_full = pairwise_distance_mean_median(x, memory_budget, n_threads)
+    means = []
+    medians = []
+    for threshold in np.quantile(y, quantiles):
+        mean, median = pairwise_distance_mean_median(x[y <= threshold], memory_budget, n_threads)
+        means.append(mean)
+        medians.append(median)
+
+    feature_dict = {}
+    names = ['{:02d}'.format(int(round(100 * q))) for q in quantiles]
+    for name, mean in zip(names, means):
+        feature_dict['disp.ratio_mean_{}'.format(name)] = mean / mean_full
+    for name, median in zip(names, medians):
+        feature_dict['disp.ratio_median_{}'.format(name)] = median / median_full
+    for name, mean in zip(names, means):
+        feature_dict['disp.diff_mean_{}'.format(name)] = mean - mean_full
+    for name, median in zip(names, medians):
+        feature_dict['disp.diff_median_{}'.format(name)] = median - median_full
+    return feature_dict
+
+### Sparse cell mapping for the 'cm_angle', 'cm_conv', and 'cm_grad' classes
+# Only the occupied cells (at most n) are visited, so the time and the memory usage scale with the sample size n, not with the number of cells blocks^dim. Empty cells do not contribute to the 'cm_angle' and 'cm_grad' features in flacco either.
+def nan_mean_sd(values):
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.nan, np.nan
+    return np.mean(values), r_sd(values)
+
+def get_cell_centers(feat_object, cells):
+    widths = (feat_object['upper'] - feat_object['lower']) / feat_object['blocks']
+    return feat_object['lower'] + (cells + 0.5) * widths
+
+# The first point with the minimum (maximum) objective value in each occupied cell
+def get_cell_best_worst(cell_ids, y, n_cells):
+    starts = np.concatenate([[0], np.cumsum(np.bincount(cell_ids, minlength=n_cells))[:-1]])
+    point_ids = np.arange(len(y))
+    best_ids = np.lexsort((point_ids, y, cell_ids))[starts]
+    worst_ids = np.lexsort((point_ids, -y, cell_ids))[starts]
+    return best_ids, worst_ids
+
+def calculate_cm_angle(feat_object):
+    x = feat_object['x']
+    y = feat_object['y']
+    if not feat_object['minimize']:
+        y = -y
+    cells = feat_object['cells']
+
+    best_ids, worst_ids = get_cell_best_worst(feat_object['cell_ids'], y, len(cells))
+    centers = get_cell_centers(feat_object, cells)
+    c2b_vects = x[best_ids] - centers
+    c2w_vects = x[worst_ids] - centers
+    c2b_dists = np.sqrt(np.sum(c2b_vects ** 2, axis=1))
+    c2w_dists = np.sqrt(np.sum(c2w_vects ** 2, axis=1))
+    denominators = c2b_dists * c2w_dists
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angles = np.arccos(np.sum(c2b_vects * c2w_vects, axis=1) / denominators) * 180 / np.pi
+        angles[(denominators == 0) | (best_ids == worst_ids)] = 0
+        y_ratios = (y[worst_ids] - y[best_ids]) / (np.max(y) - np.min(y))
+
+    feature_dict = {}
+    for name, values in [('dist_ctr2best', c2b_dists), ('dist_ctr2worst', c2w_dists), ('angle', angles), ('y_ratio_best2worst', y_ratios)]:
+        mean, sd = nan_mean_sd(values)
+        feature_dict['cm_angle.{}.mean'.format(name)] = mean
+        feature_dict['cm_angle.{}.sd'.format(name)] = sd
+    return feature_dict
+
+# Each cell is represented by the point closest to its center, as in flacco. Then, the objective values of the representatives of three neighboring cells along each axis are compared.
+# If the number of all the cells is at most "max_dense_cells" (the sample size by default), the triples are taken around all the cells, which is exactly the same as flacco. Otherwise, the triples are taken around the occupied cells only, and the convex and concave ratios are those over the triples whose inner cell is occupied. Since they are different from the features of flacco unless all the cells are occupied, they are named 'cm_conv.occupied.*' (e.g., 'cm_conv.occupied.convex.hard') so that they are never mixed with the features of flacco in the same column.
+# As in flacco, the preceding cell is found by the cell ID, i.e., it wraps around to the previous row when the cell is on the lower boundary.
+def calculate_cm_conv(feat_object, max_dense_cells=None, memory_budget=2**28, n_threads=1):
+    x = feat_object['x']
+    y = feat_object['y']
+    if not feat_object['minimize']:
+        y = -y
+    blocks = feat_object['blocks']
+    dim = len(blocks)
+    if np.min(blocks) <= 2:
+        error_msg = "Error: the cell convexity features can only be computed when all dimensions have more than 2 cells."
+        raise Exception(error_msg)
+
+    if max_dense_cells is None:
+        max_dense_cells = len(x)
+    prefix = 'cm_conv.'
+    if np.prod(blocks.astype(float)) <= max_dense_cells:
+        inner_cells = np.array(np.unravel_index(np.arange(np.prod(blocks)), blocks[::-1])).T[:, ::-1]
+    else:
+        inner_cells = feat_object['cells'].astype(int)
+        prefix = 'cm_conv.occupied.'
+    # The cells on the boundary in all the dimensions are skipped
+    inner_cells = inner_cells[~np.all((inner_cells == 0) | (inner_cells == blocks - 1), axis=1)]
+
+    # Collect the triples (preceding cell, inner cell, succeeding cell) along each axis
+    triples = []
+    for i in range(dim):
+        # The succeeding cell should be in the grid, and the ID of the preceding cell should be non-negative
+        succ_cells = inner_cells.copy()
+        succ_cells[:, i] += 1
+        pred_cells = inner_cells.copy()
+        pred_cells[:, i] -= 1
+        valid = succ_cells[:, i] < blocks[i]
+        for j in range(i, dim):
+            borrow = pred_cells[:, j] < 0
+            if not np.any(borrow):
+                break
+            pred_cells[borrow, j] += blocks[j]
+            if j + 1 < dim:
+                pred_cells[borrow, j + 1] -= 1
+            else:
+                valid &= ~borrow
+        triples.append(np.stack([pred_cells[valid], inner_cells[valid], succ_cells[valid]], axis=1).astype(feat_object['cells'].dtype))
+    triples = np.concatenate(triples)
+    names = ['convex.hard', 'concave.hard', 'convex.soft', 'concave.soft']
+    if len(triples) == 0:
+        return {prefix + name: np.nan for name in names}
+
+    # The neighboring cells are shared by many triples, so the representative of each cell is searched only once
+    cells, triple_cell_ids = np.unique(triples.reshape(-1, dim), axis=0, return_inverse=True)
+    del triples
+    point_ids = nearest_point_ids(x, get_cell_centers(feat_object, cells), memory_budget, n_threads)
+    triple_y = y[point_ids][triple_cell_ids.reshape(-1, 3)]
+
+    y_inner = triple_y[:, 1]
+    y_outer_mean = (triple_y[:, 0] + triple_y[:, 2]) / 2
+    concave_soft = y_inner > y_outer_mean
+    convex_soft = y_inner < y_outer_mean
+    ratios = np.array([np.mean(convex_soft & (y_inner < np.minimum(triple_y[:, 0], triple_y[:, 2]))),
+                       np.mean(concave_soft & (y_inner > np.maximum(triple_y[:, 0], triple_y[:, 2]))),
+                       np.mean(convex_soft),
+                       np.mean(concave_soft)])
+    return {prefix + name: ratio for name, ratio in zip(names, ratios)}
+
+# For each occupied cell with more than two points, the length of the sum of the unit vectors from each point to its nearest neighbor in the cell (directed to the worse one) divided by the number of the points
+def calculate_cm_grad(feat_object):
+    x = feat_object['x']
+    y = feat_object['y']
+    if not feat_object['minimize']:
+        y = -y
+    cell_ids = feat_object['cell_ids']
+
+    order = np.argsort(cell_ids, kind='stable')
+    counts = np.bincount(cell_ids, minlength=len(feat_object['cells']))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    grad_homo = np.full(len(counts), np.nan)
+    for k in np.nonzero(counts > 2)[0]:
+        point_ids = order[starts[k]:starts[k] + counts[k]]
+        cell_x = x[point_ids]
+        cell_y = y[point_ids]
+        dists, nn_ids = cKDTree(cell_x).query(cell_x, k=2)
+        dists, nn_ids = dists[:, 1], nn_ids[:, 1]
+        norm_vectors = np.zeros_like(cell_x)
+        moved = dists > 0
+        mult = np.where(cell_y > cell_y[nn_ids], -1., 1.)
+        norm_vectors[moved] = (cell_x[nn_ids[moved]] - cell_x[moved]) / dists[moved].reshape(-1, 1) * mult[moved].reshape(-1, 1)
+        grad_homo[k] = np.sqrt(np.sum(np.sum(norm_vectors, axis=0) ** 2)) / counts[k]
+
+    mean, sd = nan_mean_sd(grad_homo)
+    return {'cm_grad.mean': mean,
+            'cm_grad.sd': sd}
+
+# The counterpart of pflacco.calculate_feature_set
+# "memory_budget" (bytes) and "n_threads" are used only for the 'nbc', 'disp', and 'cm_conv' classes
+def calculate_native_feature_set(feat_object, ela_feature_class, memory_budget=2**28, n_threads=1):
+    start_time = time.time()
+    if ela_feature_class == 'basic':
+        feature_dict = calculate_basic(feat_object)
+    elif ela_feature_class == 'ela_distr':
+        feature_dict = calculate_ela_distr(feat_object)
+    elif ela_feature_class == 'pca':
+        feature_dict = calculate_pca(feat_object)
+    elif ela_feature_class == 'limo':
+        feature_dict = calculate_limo(feat_object)
+    elif ela_feature_class == 'ela_meta':
+        feature_dict = calculate_ela_meta(feat_object)
+    elif ela_feature_class == 'nbc':
+        feature_dict = calculate_nbc(feat_object, memory_budget=memory_budget, n_threads=n_threads)
+    elif ela_feature_class == 'disp':
+        feature_dict = calculate_disp(feat_object, memory_budget=memory_budget, n_threads=n_threads)
+    elif ela_feature_class == 'cm_angle':
+        feature_dict = calculate_cm_angle(feat_object)
+    elif ela_feature_class == 'cm_conv':
+        feature_dict = calculate_cm_conv(feat_object, memory_budget=memory_budget, n_threads=n_threads)
+    elif ela_feature_class == 'cm_grad':
+        feature_dict = calculate_cm_grad(feat_object)
+    else:
+        error_msg = "Error: %s is not supported by the native feature engine." %(ela_feature_class)
+        raise Exception(error_msg)
+
+    # No function evaluation is performed
+    feature_dict['{}.costs_fun_evals'.format(ela_feature_class)] = 0
+    feature_dict['{}.costs_runtime'.format(ela_feature_class)] = round(time.time() - start_time, 3)
+    return feature_dict
+
+# Compare the native features with those computed by pflacco
+def check_parity(sample_data_file_paths, ela_feature_classes, rtol=1e-6, atol=1e-8):
+    from pflacco.pflacco import create_feature_object, calculate_feature_set
+    from sample_store import load_sample
+
+    n_failures = 0
+    for sample_data_file_path in sample_data_file_paths:
+        sample_x, sample_f = load_sample(sample_data_file_path)
+        for ela_feature_class in ela_feature_classes:
+            # The same number of blocks as in feature_computation.py
+            blocks = None
+            if ela_feature_class.startswith('cm_'):
+                blocks = 3
+            feat_object = create_feature_object(x=sample_x, y=sample_f, minimize=True, lower=-5, upper=5, blocks=blocks)
+            native_feat_object = create_native_feature_object(sample_x, sample_f, minimize=True, lower=-5, upper=5, blocks=blocks)
+            ref_dict = calculate_feature_set(feat_object, ela_feature_class)
+            native_dict = calculate_native_feature_set(native_feat_object, ela_feature_class)
+            if list(ref_dict.keys()) != list(native_dict.keys()):
+                n_failures += 1
+                print("Mismatch: {}, {}, the feature names are different: {} vs. {}".format(sample_data_file_path, ela_feature_class, list(ref_dict.keys()), list(native_dict.keys())))
+                continue
+            for key, ref_value in ref_dict.items():
+                if key.endswith('costs_runtime'):
+                    continue
+                ref_value = float(ref_value)
+                value = float(native_dict[key])
+                if np.isnan(ref_value) and np.isnan(value):
+                    continue
+                if not np.isclose(value, ref_value, rtol=rtol, atol=atol):
+                    n_failures += 1
+                    print("Mismatch: {}, {}={} (pflacco: {})".format(sample_data_file_path, key, value, ref_value))
+    print("{} mismatched features".format(n_failures))
+    return n_failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the native feature engine with pflacco')
+    parser.add_argument('sample_data_file_paths', nargs='+')
+    parser.add_argument('--feature_classes', nargs='+', default=native_feature_classes)
+    args = parser.parse_args()
+
+    check_parity(args.sample_data_file_paths, args.feature_classes)
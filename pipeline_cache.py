@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+import hashlib
+import json
+import argparse
+import os
+
+# A content-addressed cache for the outputs of the pipeline (sample -> feature -> table -> classification).
+# The manifest records the key of each output file. The key is a hash of everything the output depends on: the contents of the input files, the parameters of the stage, and the versions of the libraries.
+# An output is recomputed only if it does not exist or its key in the manifest is different from the current key.
+default_manifest_file_path = './pipeline_manifest.json'
+
+def library_versions():
+    from importlib import metadata
+    versions = {}
+    for package in ['numpy', 'scipy', 'scikit-learn', 'pandas', 'pflacco', 'cocoex', 'pyDOE']:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+class PipelineCache:
+    def __init__(self, manifest_file_path=default_manifest_file_path, save_interval=100):
+        self.manifest_file_path = manifest_file_path
+        self.save_interval = save_interval
+        self.n_unsaved = 0
+        self.stats = {}
+        self.versions = library_versions()
+        # The inputs and the parameters of each key computed in this process, which are recorded with the output so that garbage_collect can compute its key again
+        self.recipes = {}
+        # "outputs" maps each output file path to its key and stage, and "files" memoizes the digest of each file by its size and modification time
+        self.manifest = {'outputs': {}, 'files': {}}
+        if os.path.exists(manifest_file_path):
+            with open(manifest_file_path, 'r') as fh:
+                self.manifest = json.load(fh)
+
+    def save(self):
+        tmp_file_path = self.manifest_file_path + '.tmp'
+        with open(tmp_file_path, 'w') as fh:
+            json.dump(self.manifest, fh)
+        os.replace(tmp_file_path, self.manifest_file_path)
+        self.n_unsaved = 0
+
+    # Return None if the file does not exist
+    def file_digest(self, file_path):
+        file_path = os.path.normpath(file_path)
+        if not os.path.exists(file_path):
+            return None
+        st = os.stat(file_path)
+        memo = self.manifest['files'].get(file_path)
+        if memo is not None and memo['size'] == st.st_size and memo['mtime_ns'] == st.st_mtime_ns:
+            return memo['sha256']
+
+        h = hashlib.sha256()
+        with open(file_path, 'rb') as fh:
+            for block in iter(lambda: fh.read(2**20), b''):
+                h.update(block)
+        self.manifest['files'][file_path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': h.hexdigest()}
+        return h.hexdigest()
+
+    # The key of an output of "stage" computed from "input_file_paths" with "params".
+    # The key is None if one of the input files does not exist, so that the output is never fresh and the stage fails through its normal error handling.
+    def compute_key(self, stage, input_file_paths, params):
+        digests = [self.file_digest(file_path) for file_path in input_file_paths]
+        if None in digests:
+            return None
+        data = {'stage': stage,
+                'inputs': digests,
+                'params': params,
+                'versions': self.versions}
+        key = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+        self.recipes[key] = {'inputs': [os.path.normpath(file_path) for file_path in input_file_paths], 'params': json.loads(json.dumps(params, sort_keys=True, default=str))}
+        return key
+
+    # Return True if the output is up to date. The result is counted as a hit or a miss of "stage".
+    def is_fresh(self, stage, output_file_path, key):
+        output_file_path = os.path.normpath(output_file_path)
+        entry = self.manifest['outputs'].get(output_file_path)
+        fresh = key is not None and entry is not None and entry['key'] == key and os.path.exists(output_file_path)
+        stage_stats = self.stats.setdefault(stage, {'hits': 0, 'misses': 0})
+        if fresh:
+            stage_stats['hits'] += 1
+        else:
+            stage_stats['misses'] += 1
+        return fresh
+
+    # An output computed without a key (see compute_key) is not recorded
+    def record(self, stage, output_file_path, key):
+        if key is None:
+            return
+        output_file_path = os.path.normpath(output_file_path)
+        self.manifest['outputs'][output_file_path] = dict({'stage': stage, 'key': key}, **self.recipes.get(key, {}))
+        self.n_unsaved += 1
+        if self.n_unsaved >= self.save_interval:
+            self.save()
+
+    def report(self):
+        for stage, stage_stats in self.stats.items():
+            print("Cache: stage={}, hits={}, misses={}".format(stage, stage_stats['hits'], stage_stats['misses']))
+
+    # Return True if the recorded key of an output is different from the key computed from the current contents of its inputs and the current versions of the libraries, e.g., its sample file has been recreated. An output whose inputs no longer exist is also stale.
+    # The outputs recorded without their inputs and parameters (by an older version of this file) are never stale.
+    def is_stale(self, output_file_path):
+        entry = self.manifest['outputs'][output_file_path]
+        if 'inputs' not in entry:
+            return False
+        if not all([os.path.exists(file_path) for file_path in entry['inputs']]):
+            return True
+        return self.compute_key(entry['stage'], entry['inputs'], entry['params']) != entry['key']
+
+    # Find the stale outputs in the manifest (see is_stale) and the files in "dir_paths" that are not recorded in the manifest (untracked files), and forget the recorded outputs that no longer exist.
+    # If "dry_run" is False, the stale outputs are removed. The untracked files are removed only if "delete_untracked" is also True, since they include the files written without the cache, e.g., by the Torque mode, which are never computed again by "--cache".
+    def garbage_collect(self, dir_paths, dry_run=True, delete_untracked=False):
+        stale = [file_path for file_path in self.manifest['outputs'] if os.path.exists(file_path) and self.is_stale(file_path)]
+        for file_path in stale:
+            print("Stale: {}".format(file_path))
+            if not dry_run:
+                os.remove(file_path)
+                del self.manifest['outputs'][file_path]
+
+        untracked = []
+        for dir_path in dir_paths:
+            for root, dirs, files in os.walk(dir_path):
+                for file_name in files:
+                    file_path = os.path.normpath(os.path.join(root, file_name))
+                    if file_path not in self.manifest['outputs']:
+                        untracked.append(file_path)
+        for file_path in untracked:
+            print("Untracked: {}".format(file_path))
+            if not dry_run and delete_untracked:
+                os.remove(file_path)
+
+        missing = [file_path for file_path in self.manifest['outputs'] if not os.path.exists(file_path)]
+        for file_path in missing:
+            del self.manifest['outputs'][file_path]
+        for file_path in [file_path for file_path in self.manifest['files'] if not os.path.exists(file_path)]:
+            del self.manifest['files'][file_path]
+        if not dry_run:
+            self.save()
+        print("{} stale outputs, {} untracked files, {} missing outputs".format(len(stale), len(untracked), len(missing)))
+        if not dry_run and not delete_untracked and len(untracked) > 0:
+            print("Warning. The untracked files were not removed. They are removed only with '--delete_untracked'")
+        return stale, untracked
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the cache of the pipeline')
+    parser.add_argument('command', choices=['gc', 'summary'])
+    parser.add_argument('dir_paths', nargs='*', default=['./sample_data', './ela_feature_dataset', './feature_table_data', './classification_results'])
+    parser.add_argument('--manifest_file_path', default=default_manifest_file_path)
+    parser.add_argument('--delete', action='store_true', help="Actually remove the stale outputs found by 'gc'")
+    parser.add_argument('--delete_untracked', action='store_true', help="With '--delete', also remove the files that are not recorded in the manifest. They include the files written without '--cache', which cannot be recomputed by '--cache' alone")
+    args = parser.parse_args()
+
+    cache = PipelineCache(args.manifest_file_path)
+    if args.command == 'gc':
+        cache.garbage_collect(args.dir_paths, dry_run=not args.delete, delete_untracked=args.delete_untracked)
+    else:
+        n_outputs = {}
+        for entry in cache.manifest['outputs'].values():
+            n_outputs[entry['stage']] = n_outputs.get(entry['stage'], 0) + 1
+        for stage, n in n_outputs.items():
+            print("stage={}, outputs={}".format(stage, n))
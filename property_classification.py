@@ -3,17 +3,19 @@
 import numpy as np
 import pandas as pd
 import os
-import sys
+import argparse
+import multiprocessing
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score
+from pipeline_cache import default_manifest_file_path, PipelineCache
 # from mlxtend.feature_selection import SequentialFeatureSelector as SFS
 # from sklearn.feature_selection import RFE
-            
-def classification_lopo_cv(res_class_file_path, table_data_file_path, dim, left_fun_id, target_label):
-    problem_info_columns = ['dim', 'fun', 'instance']
-    high_level_prop_labels = ['multimodality', 'globalstructure', 'separability', 'variablescaling', 'homogeneity', 'basinsizes', 'glcontrast', 'fungroup']
-                    
-    table_df = pd.read_csv(table_data_file_path, header=0)
+
+problem_info_columns = ['dim', 'fun', 'instance']
+high_level_prop_labels = ['multimodality', 'globalstructure', 'separability', 'variablescaling', 'homogeneity', 'basinsizes', 'glcontrast', 'fungroup']
+
+# Extract the rows for "dim" from the table and clean them up
+def clean_table(table_df, dim):
     table_df = table_df[table_df['dim'] == dim]
     
     # remove columns that include inf or nan
@@ -30,7 +32,10 @@ def classification_lopo_cv(res_class_file_path, table_data_file_path, dim, left_
         if unum == 1:
             dup_columns.append(column)            
     table_df = table_df.drop(dup_columns, axis=1)                
+    return table_df
 
+# Return the accuracy on the left-out function, the names of the features, and their importances (the mean decrease in impurity) in the random forest
+def fit_lopo_fold(table_df, left_fun_id, target_label, n_jobs=1, n_estimators=1000):
     # Split data sets into train and test datasets
     # Test data
     test_df = table_df[table_df['fun'] == left_fun_id]
@@ -47,35 +52,124 @@ def classification_lopo_cv(res_class_file_path, table_data_file_path, dim, left_
     X_train = train_df.values
     
     # train
-    estimator = RandomForestClassifier(n_estimators=1000, random_state=0)    
+    estimator = RandomForestClassifier(n_estimators=n_estimators, random_state=0, n_jobs=n_jobs)    
     estimator.fit(X_train, y_train)
     # test
     pred_labels = estimator.predict(X_test)
-    score = accuracy_score(y_test, pred_labels)
+    return accuracy_score(y_test, pred_labels), list(train_df.columns), estimator.feature_importances_
+
+def lopo_cv_fold(table_df, left_fun_id, target_label, n_jobs=1):
+    return fit_lopo_fold(table_df, left_fun_id, target_label, n_jobs)[0]
 
+def write_accuracy(res_class_file_path, score):
     with open(res_class_file_path, 'w') as fh:
         fh.write(str(score))
+
+def get_res_class_file_path(res_class_dir_path, target_label, left_fun_id, dim):
+    return os.path.join(res_class_dir_path, 'accuracy_{}_f{}_DIM{}.csv'.format(target_label, left_fun_id, dim))
+
+def classification_lopo_cv(res_class_file_path, table_data_file_path, dim, left_fun_id, target_label):
+    table_df = pd.read_csv(table_data_file_path, header=0)
+    table_df = clean_table(table_df, dim)
+    score = lopo_cv_fold(table_df, left_fun_id, target_label)
+    write_accuracy(res_class_file_path, score)
+
+# The cache key of a fold depends on the contents of the table and on the settings of the fold
+def get_fold_cache_key(cache, table_data_file_path, dim, left_fun_id, target_label):
+    params = {'dim': dim, 'left_fun_id': left_fun_id, 'target_label': target_label, 'classifier': 'RandomForestClassifier', 'n_estimators': 1000, 'random_state': 0}
+    return cache.compute_key('classify', [table_data_file_path], params)
+
+def read_accuracy(res_class_file_path):
+    with open(res_class_file_path, 'r') as fh:
+        return float(fh.read())
+
+def run_fold(args):
+    table_df, dim, left_fun_id, target_label, n_jobs = args
+    return dim, left_fun_id, target_label, lopo_cv_fold(table_df, left_fun_id, target_label, n_jobs)
+
+# Perform the LOPO-CV for all the combinations of "dims", "fun_ids", and "target_labels".
+# The table is loaded only once, and it is cleaned only once for each dimension.
+# If "parallel" is 'fold', the folds are distributed to "n_workers" processes. If "parallel" is 'forest', each random forest is trained by "n_workers" threads.
+# In addition to the accuracy file for each fold, all the results are saved in "accuracy_results.csv" in "res_class_dir_path".
+# If "cache" (a PipelineCache in pipeline_cache.py) is given, the accuracies of the folds that are up to date with the table are read from their files instead of being computed again.
+def classification_lopo_cv_all(res_class_dir_path, table_data_file_path, dims, fun_ids, target_labels, n_workers=1, parallel='fold', cache=None):
+    all_table_df = pd.read_csv(table_data_file_path, header=0)
+
+    tasks = []
+    cached_results = []
+    fold_keys = {}
+    for dim in dims:
+        if dim not in set(all_table_df['dim']):
+            print("Warning. The table does not include dimension={}, so skipped".format(dim))
+            continue
+        table_df = clean_table(all_table_df, dim)
+        for left_fun_id in fun_ids:
+            for target_label in target_labels:
+                if cache is not None:
+                    key = get_fold_cache_key(cache, table_data_file_path, dim, left_fun_id, target_label)
+                    res_class_file_path = get_res_class_file_path(res_class_dir_path, target_label, left_fun_id, dim)
+                    if cache.is_fresh('classify', res_class_file_path, key):
+                        cached_results.append((dim, left_fun_id, target_label, read_accuracy(res_class_file_path)))
+                        continue
+                    fold_keys[(dim, left_fun_id, target_label)] = key
+                n_jobs = 1
+                if parallel == 'forest':
+                    n_jobs = n_workers
+                tasks.append((table_df, dim, left_fun_id, target_label, n_jobs))
+
+    if parallel == 'fold' and n_workers > 1:
+        with multiprocessing.Pool(processes=n_workers) as pool:
+            results = pool.map(run_fold, tasks, chunksize=1)
+    else:
+        results = list(map(run_fold, tasks))
+
+    for dim, left_fun_id, target_label, score in results:
+        res_class_file_path = get_res_class_file_path(res_class_dir_path, target_label, left_fun_id, dim)
+        write_accuracy(res_class_file_path, score)
+        if cache is not None:
+            cache.record('classify', res_class_file_path, fold_keys[(dim, left_fun_id, target_label)])
+
+    # Keep the order of the folds regardless of which of them were cached
+    order = {(dim, left_fun_id, target_label): i for i, (dim, left_fun_id, target_label) in enumerate([(d, f, t) for d in dims for f in fun_ids for t in target_labels])}
+    results = sorted(cached_results + list(results), key=lambda result: order[result[:3]])
+    results_df = pd.DataFrame(results, columns=['dim', 'fun', 'target', 'accuracy'])
+    results_file_path = os.path.join(res_class_dir_path, 'accuracy_results.csv')
+    results_df.to_csv(results_file_path, index=False)
+    if cache is not None:
+        cache.record('classify', results_file_path, cache.compute_key('classify', [table_data_file_path], {'dims': list(dims), 'fun_ids': list(fun_ids), 'target_labels': list(target_labels)}))
+        cache.save()
+        cache.report()
+    return results_df
                 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Classify the high-level properties of the BBOB functions in the LOPO-CV manner')
+    parser.add_argument('--mode', choices=['sequential', 'multiprocessing', 'torque'], default='sequential', help="'torque' runs a single fold as a job thrown by throw_job_hpc.py")
+    parser.add_argument('--n_workers', type=int, default=os.cpu_count())
+    parser.add_argument('--parallel', choices=['fold', 'forest'], default='fold', help="'fold' distributes the folds to processes, and 'forest' trains each random forest by multiple threads")
+    parser.add_argument('--cache', action='store_true', help='Skip folds whose accuracy files are up to date with the table according to the manifest of pipeline_cache.py')
+    parser.add_argument('--manifest_file_path', default=default_manifest_file_path, help="The manifest file for '--cache'")
+    parser.add_argument('--target_label', help="The target label for the 'torque' mode")
+    parser.add_argument('--dim', type=int, help="The dimension for the 'torque' mode")
+    parser.add_argument('--left_fun_id', type=int, help="The left-out function ID for the 'torque' mode")
+    args = parser.parse_args()
+
     feature_set_name = 'lhs_multiplier50_sid0_basic_ela_distr_pca_limo_ic_disp_nbc_tpca2_ela_level_tpca2_ela_meta_dims3_5_10_20_40_80_160_320_640'
     table_data_file_path = os.path.join('./feature_table_data', '{}.csv'.format(feature_set_name))
     cross_valid_type = 'lopo_cv'
     res_class_dir_path = os.path.join('classification_results', feature_set_name)
     os.makedirs(res_class_dir_path, exist_ok=True)
 
-    run_by_torque = False
-    
-    # Example 1. A sequential approach    
-    if run_by_torque == False:
-        for dim in [2, 3, 5, 10, 20, 40, 80, 160, 320, 640]:
-            for left_fun_id in range(1, 24+1):
-                for target_label in ['multimodality', 'globalstructure', 'separability', 'variablescaling', 'homogeneity', 'basinsizes', 'glcontrast', 'fungroup']:
-                    res_class_file_path = os.path.join(res_class_dir_path, 'accuracy_{}_f{}_DIM{}.csv'.format(target_label, left_fun_id, dim))                
-                    classification_lopo_cv(res_class_file_path, table_data_file_path, dim, left_fun_id, target_label)
+    if args.mode in ['sequential', 'multiprocessing']:
+        # Example 1. A sequential approach or a parallel approach by multiprocessing
+        n_workers = 1
+        if args.mode == 'multiprocessing':
+            n_workers = args.n_workers
+        dims = [2, 3, 5, 10, 20, 40, 80, 160, 320, 640]
+        cache = None
+        if args.cache:
+            cache = PipelineCache(args.manifest_file_path)
+        classification_lopo_cv_all(res_class_dir_path, table_data_file_path, dims, range(1, 24+1), high_level_prop_labels, n_workers=n_workers, parallel=args.parallel, cache=cache)
     else:
         # Example 2. A pseudo parallel approach            
-        target_label = sys.argv[1]
-        dim = int(sys.argv[2])
-        left_fun_id = int(sys.argv[3])
-        res_class_file_path = os.path.join(res_class_dir_path, 'accuracy_{}_f{}_DIM{}.csv'.format(target_label, left_fun_id, dim))                
-        classification_lopo_cv(res_class_file_path, table_data_file_path, dim, left_fun_id, target_label)
+        res_class_file_path = get_res_class_file_path(res_class_dir_path, args.target_label, args.left_fun_id, args.dim)
+        classification_lopo_cv(res_class_file_path, table_data_file_path, args.dim, args.left_fun_id, args.target_label)
@@ -7,9 +7,17 @@ import cocoex  # only experimentation module
 from pyDOE import lhs
 import sys
 import os
+import time
+import multiprocessing
+import zlib
+from sample_store import sample_formats, get_sample_data_file_path, save_sample, save_sample_chunks
+from bbob_vectorized import create_batch_fun, evaluate_sample
+from pipeline_cache import default_manifest_file_path, PipelineCache
+import argparse
     
 # Sample a set of solutions with the size "sample_size". 
-def create_sample(fun, sampling_method, sample_size):
+# If "evaluation" is 'batch', the sample is evaluated by the vectorized BBOB functions in bbob_vectorized.py. If it is 'loop', each solution is evaluated by cocoex one by one.
+def create_sample(fun, sampling_method, sample_size, evaluation='batch'):
     dim = fun.dimension
 
     # Each solution is generated in the range [0,1]^dim.    
@@ -32,20 +40,101 @@ def create_sample(fun, sampling_method, sample_size):
     sample = (ubound - lbound) * sample + lbound
 
     # Evaluate each solution in the sample
-    obj_values = []
-    for x in sample:
-        obj_values.append(fun(x))
+    if evaluation == 'batch':
+        obj_values = evaluate_sample(fun, sample)
+    else:
+        obj_values = []
+        for x in sample:
+            obj_values.append(fun(x))
 
     return sample, obj_values
 
+# Yield the sample of "sample_size" solutions in [0,1]^dim in chunks of "chunk_size" solutions.
+# For 'lhs', the sample follows the same distribution as lhs(dim, sample_size, criterion='center') in pyDOE: each column is a random permutation of the centers of the "sample_size" intervals. It is not the same sample for the same random state, since pyDOE draws uniform numbers in the intervals (by np.random.rand) before the permutations, even though they are not used for the centers. The columns are written to "tmp_file_path" one by one, and each chunk of rows is read back from it, so that neither the whole sample nor all the permutations are kept in memory.
+def generate_sample_chunks(sampling_method, sample_size, dim, chunk_size, tmp_file_path):
+    if sampling_method == 'lhs':
+        cut = np.linspace(0, 1, sample_size + 1)
+        centers = (cut[:sample_size] + cut[1:]) / 2
+        try:
+            with open(tmp_file_path, 'w+b') as fh:
+                for j in range(dim):
+                    np.random.permutation(centers).tofile(fh)
+                for start in range(0, sample_size, chunk_size):
+                    n_rows = min(chunk_size, sample_size - start)
+                    chunk = np.empty((n_rows, dim))
+                    for j in range(dim):
+                        fh.seek((j * sample_size + start) * centers.itemsize)
+                        chunk[:, j] = np.fromfile(fh, dtype=np.float64, count=n_rows)
+                    yield chunk
+        finally:
+            if os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+    elif sampling_method == 'random':
+        for start in range(0, sample_size, chunk_size):
+            yield np.random.random_sample((min(chunk_size, sample_size - start), dim))
+    elif sampling_method == 'ilhs':
+        # The improved LHS of pflacco cannot be generated chunk by chunk
+        sample = np.asarray(create_initial_sample(n_obs=sample_size, dim=dim, type='lhs'))
+        for start in range(0, sample_size, chunk_size):
+            yield sample[start:start + chunk_size]
+    else:
+        error_msg = "Error: %s is not defined." %(sampling_method)
+        raise Exception(error_msg)
+
+# Map each chunk from [0,1]^dim to [-5,5]^dim and evaluate it. The vectorized function is created only once for all the chunks.
+def evaluate_sample_chunks(fun, chunks, evaluation='batch'):
+    lbound = np.full(fun.dimension, -5.)
+    ubound = np.full(fun.dimension, 5.)
+    batch_fun = None
+    if evaluation == 'batch':
+        batch_fun = create_batch_fun(fun)
+
+    for chunk in chunks:
+        chunk = (ubound - lbound) * chunk + lbound
+        if evaluation == 'batch':
+            obj_values = evaluate_sample(fun, chunk, batch_fun=batch_fun)
+        else:
+            obj_values = np.array([fun(x) for x in chunk])
+        yield chunk, obj_values
+
+# Create the sample of "fun" and stream it to "sample_data_file_path" in chunks of "chunk_size" solutions, so that the memory usage does not depend on the sample size
+def create_sample_chunked(fun, sampling_method, sample_size, sample_data_file_path, chunk_size=1000, evaluation='batch'):
+    chunks = generate_sample_chunks(sampling_method, sample_size, fun.dimension, chunk_size, sample_data_file_path + '.lhs.tmp')
+    save_sample_chunks(sample_data_file_path, sample_size, fun.dimension, evaluate_sample_chunks(fun, chunks, evaluation))
+
+# The suites opened by each worker process
+worker_suites = {}
+
+# Create the sample of a single problem. Each worker opens its own suite and gets the problem by its index in the suite.
+def create_sample_task(task):
+    bbob_suite, problem_index, sample_data_file_path, sampling_method, sample_size, chunk_size, evaluation, sample_id = task
+    start_time = time.time()
+    # The worker processes inherit the same random state from the parent process, so it is reseeded for each task.
+    # The seed is derived from the sample ID, the suite, and the problem index, so that the sample of each problem is reproducible regardless of the worker that creates it.
+    np.random.seed([sample_id, zlib.crc32(bbob_suite.encode()), problem_index])
+    if bbob_suite not in worker_suites:
+        worker_suites[bbob_suite] = cocoex.Suite(bbob_suite, "", "")
+    problem = worker_suites[bbob_suite].get_problem(problem_index)
+    create_sample_chunked(problem, sampling_method, sample_size, sample_data_file_path, chunk_size, evaluation)
+    problem.free()
+    return task, time.time() - start_time
+
 # This function is based on https://github.com/numbbo/coco/blob/master/code-experiments/build/python/example_experiment_for_beginners.py
 # For each BBOB function, 15 independent runs are perfromed on 15 instances, respectively (instance IDs: 1, 2, 3, 4, 5, 71, 72, 73, 74, 75, 76, 77, 78, 79, 80)
 # In contrast, for each large-scale BBOB function, instance IDs are 1, ..., 15.
 # For the sake of simplicity, the instance IDs are set to 1, ..., 15 for both the BBOB and large-scale BBOB function sets.
-def create_sample_bbob(bbob_suite='bbob', sample_multiplier=50, sampling_method='lhs', sample_dir_path='./sample_data', sample_id=0):
+# If "cache" (a PipelineCache in pipeline_cache.py) is given, the samples that have already been created with the same settings are not created again.
+# If "n_workers" > 1 or "chunk_size" is given, the problems are distributed to "n_workers" processes, and each sample is streamed to its file in chunks of "chunk_size" solutions (see create_sample_bbob_parallel).
+def create_sample_bbob(bbob_suite='bbob', sample_multiplier=50, sampling_method='lhs', sample_dir_path='./sample_data', sample_id=0, sample_format='npy', evaluation='batch', cache=None, n_workers=1, chunk_size=None):
     sample_dir_path = os.path.join(sample_dir_path, '{}_multiplier{}_sid{}'.format(sampling_method, sample_multiplier, sample_id))
     os.makedirs(sample_dir_path, exist_ok=True)
 
+    if n_workers > 1 or chunk_size is not None:
+        if chunk_size is None:
+            chunk_size = 1000
+        create_sample_bbob_parallel(bbob_suite, sample_multiplier, sampling_method, sample_dir_path, sample_format, evaluation, cache, n_workers, chunk_size, sample_id)
+        return
+
     ### input
     output_folder = 'tmp'
 
@@ -65,35 +154,100 @@ def create_sample_bbob(bbob_suite='bbob', sample_multiplier=50, sampling_method=
             break
 
         sample_size = sample_multiplier * problem.dimension        
-        sample, obj_values = create_sample(problem, sampling_method, sample_size)
 
         fun_id = int(problem.info.split('_f')[1].split('_')[0])
         # Actual instance ID
         #instance_id = int(problem.info.split('_i')[1].split('_')[0])
         instance_id = count_instance_id
-        
-        # Recode each pair of x and f(x) in a csv file    
-        sample_data_file_path = os.path.join(sample_dir_path, 'x_f_data_{}_f{}_DIM{}_i{}.csv'.format(bbob_suite, fun_id, problem.dimension, instance_id))
-        with open(sample_data_file_path, 'w') as fh:
-            for x, obj_val in zip(sample, obj_values):
-                data_str = '{},'.format(obj_val)                
-                data_str += ','.join([str(y) for y in x])
-                fh.write(data_str + '\n')
+        sample_data_file_path = get_sample_data_file_path(sample_dir_path, bbob_suite, fun_id, problem.dimension, instance_id, sample_format)
+
+        # The sample is random, so its key depends only on the problem and the settings
+        if cache is not None:
+            key = cache.compute_key('sample', [], {'problem_id': problem.id, 'sampling_method': sampling_method, 'sample_size': sample_size})
+        if cache is None or not cache.is_fresh('sample', sample_data_file_path, key):
+            sample, obj_values = create_sample(problem, sampling_method, sample_size, evaluation)
+
+            # Recode each pair of x and f(x) in a .npy (or csv) file
+            save_sample(sample_data_file_path, sample, obj_values)
+            if cache is not None:
+                cache.record('sample', sample_data_file_path, key)
 
         count_instance_id += 1
         if count_instance_id > 15:
             count_instance_id = 1
                 
         minimal_print(problem, final=problem.index == len(suite) - 1)
+
+    if cache is not None:
+        cache.save()
+        cache.report()
+
+# The parallel version of create_sample_bbob. The instance IDs are renumbered to 1, ..., 15 in the same way.
+# The observer for cocopp is not used because the worker processes cannot share it.
+# The random seed of each sample is derived from "sample_id" and the problem (see create_sample_task).
+def create_sample_bbob_parallel(bbob_suite, sample_multiplier, sampling_method, sample_dir_path, sample_format='npy', evaluation='batch', cache=None, n_workers=1, chunk_size=1000, sample_id=0):
+    suite = cocoex.Suite(bbob_suite, "", "")
+
+    tasks = []
+    task_keys = {}
+    count_instance_id = 1
+    for problem in suite:
+        if bbob_suite == 'bbob' and problem.dimension >= 20:
+            break
+
+        sample_size = sample_multiplier * problem.dimension
+        fun_id = int(problem.info.split('_f')[1].split('_')[0])
+        instance_id = count_instance_id
+        sample_data_file_path = get_sample_data_file_path(sample_dir_path, bbob_suite, fun_id, problem.dimension, instance_id, sample_format)
+
+        task = (bbob_suite, problem.index, sample_data_file_path, sampling_method, sample_size, chunk_size, evaluation, sample_id)
+        if cache is not None:
+            task_keys[task] = cache.compute_key('sample', [], {'problem_id': problem.id, 'sampling_method': sampling_method, 'sample_size': sample_size})
+        if cache is None or not cache.is_fresh('sample', sample_data_file_path, task_keys[task]):
+            tasks.append(task)
+
+        count_instance_id += 1
+        if count_instance_id > 15:
+            count_instance_id = 1
+
+    # The samples with higher dimensions are created first so that they are not stragglers at the end of the run
+    tasks = sorted(tasks, key=lambda task: task[4], reverse=True)
+    start_time = time.time()
+    def record_results(results):
+        for n_done, (task, task_time) in enumerate(results, 1):
+            print("Done: {} ({:.1f}s) [{}/{}, elapsed={:.0f}s]".format(task[2], task_time, n_done, len(tasks), time.time() - start_time))
+            if cache is not None:
+                cache.record('sample', task[2], task_keys[task])
+
+    if n_workers == 1:
+        record_results(map(create_sample_task, tasks))
+    else:
+        # The pool is terminated even if a task raises an exception
+        with multiprocessing.Pool(processes=n_workers) as pool:
+            record_results(pool.imap_unordered(create_sample_task, tasks))
+    if cache is not None:
+        cache.save()
+        cache.report()
         
 if __name__ == '__main__':
     # np.random.seed(seed=1)
     # random.seed(1)
+    parser = argparse.ArgumentParser(description='Create samples on the BBOB functions')
+    parser.add_argument('--n_workers', type=int, default=1, help='The number of worker processes, each of which creates the samples of different problems')
+    parser.add_argument('--chunk_size', type=int, default=None, help='Create each sample in chunks of this number of solutions, which are streamed to the file. The default is 1000 if "--n_workers" > 1')
+    parser.add_argument('--sample_format', choices=sample_formats, default='npy')
+    parser.add_argument('--cache', action='store_true', help='Skip samples that have already been created with the same settings according to the manifest of pipeline_cache.py')
+    parser.add_argument('--manifest_file_path', default=default_manifest_file_path, help="The manifest file for '--cache'")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache:
+        cache = PipelineCache(args.manifest_file_path)
     
     ## 1. Sample a set of solutions with the size = 50 * dimension on the noiseless BBOB functions
-    create_sample_bbob(bbob_suite='bbob', sample_multiplier=50, sampling_method='lhs', sample_dir_path='./sample_data', sample_id=0)
+    create_sample_bbob(bbob_suite='bbob', sample_multiplier=50, sampling_method='lhs', sample_dir_path='./sample_data', sample_id=0, sample_format=args.sample_format, cache=cache, n_workers=args.n_workers, chunk_size=args.chunk_size)
 
     ## 2. Sample a set of solutions with the size = 50 * dimension on the large-scale BBOB functions
-    create_sample_bbob(bbob_suite='bbob-largescale', sample_multiplier=50, sampling_method='lhs', sample_dir_path='./sample_data', sample_id=0)
+    create_sample_bbob(bbob_suite='bbob-largescale', sample_multiplier=50, sampling_method='lhs', sample_dir_path='./sample_data', sample_id=0, sample_format=args.sample_format, cache=cache, n_workers=args.n_workers, chunk_size=args.chunk_size)
 
     
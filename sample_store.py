@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import glob
+import os
+
+# Each sample is stored as a binary .npy file, instead of a text csv file.
+# The array in the file has the shape (sample size, 1 + dimension). Similar to the csv file, the first column is f(x) and the remaining columns are x.
+# Since the .npy file keeps the float64 values as is, they can be round-tripped without any loss of precision. The file can also be memory-mapped without copying the data.
+sample_formats = ['npy', 'csv']
+
+def get_sample_data_file_path(sample_dir_path, bbob_suite, fun_id, dim, instance_id, sample_format='npy'):
+    return os.path.join(sample_dir_path, 'x_f_data_{}_f{}_DIM{}_i{}.{}'.format(bbob_suite, fun_id, dim, instance_id, sample_format))
+
+def save_sample(sample_data_file_path, sample_x, sample_f):
+    data_set = np.empty((len(sample_f), 1 + len(sample_x[0])), dtype=np.float64)
+    data_set[:, 0] = sample_f
+    data_set[:, 1:] = sample_x
+
+    if sample_data_file_path.endswith('.npy'):
+        # Write to a temporary file first so that a half-written file is never left with the final name
+        tmp_file_path = sample_data_file_path + '.tmp'
+        with open(tmp_file_path, 'wb') as fh:
+            np.save(fh, data_set)
+        os.replace(tmp_file_path, sample_data_file_path)
+    else:
+        # Recode each pair of x and f(x) in a csv file
+        with open(sample_data_file_path, 'w') as fh:
+            for row in data_set:
+                fh.write(','.join([str(y) for y in row]) + '\n')
+
+# Save a sample of "sample_size" solutions chunk by chunk, where "chunks" yields pairs of X and f(X).
+# Only a single chunk is kept in memory. The file is written to a temporary file first, as in save_sample.
+def save_sample_chunks(sample_data_file_path, sample_size, dim, chunks):
+    tmp_file_path = sample_data_file_path + '.tmp'
+    n_rows = 0
+    with open(tmp_file_path, 'wb') as fh:
+        if sample_data_file_path.endswith('.npy'):
+            header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.float64)), 'fortran_order': False, 'shape': (sample_size, 1 + dim)}
+            np.lib.format.write_array_header_1_0(fh, header)
+        for chunk_x, chunk_f in chunks:
+            data_set = np.empty((len(chunk_f), 1 + dim), dtype=np.float64)
+            data_set[:, 0] = chunk_f
+            data_set[:, 1:] = chunk_x
+            if sample_data_file_path.endswith('.npy'):
+                fh.write(data_set.tobytes())
+            else:
+                fh.write(''.join([','.join([str(y) for y in row]) + '\n' for row in data_set]).encode())
+            n_rows += len(data_set)
+
+    if n_rows != sample_size:
+        os.remove(tmp_file_path)
+        error_msg = "Error: {} rows were given for {}, but the sample size is {}.".format(n_rows, sample_data_file_path, sample_size)
+        raise Exception(error_msg)
+    os.replace(tmp_file_path, sample_data_file_path)
+
+# Return the sample X and the objective values f(X).
+# For a .npy file, both are views of a read-only memory-mapped array when "mmap" is True.
+def load_sample(sample_data_file_path, mmap=True):
+    if sample_data_file_path.endswith('.npy'):
+        mmap_mode = None
+        if mmap:
+            mmap_mode = 'r'
+        data_set = np.load(sample_data_file_path, mmap_mode=mmap_mode)
+    else:
+        data_set = np.loadtxt(sample_data_file_path, delimiter=",", comments="#", dtype=np.float64, ndmin=2)
+    sample_f = data_set[:, 0]
+    sample_x = data_set[:, 1:]
+    return sample_x, sample_f
+
+# Convert all the csv files in "sample_dir_path" to .npy files.
+# If "check" is True, each .npy file is read back and compared with the csv file.
+def convert_sample_dir(sample_dir_path, remove_csv=False, check=True):
+    csv_file_paths = sorted(glob.glob(os.path.join(sample_dir_path, 'x_f_data_*.csv')))
+    for csv_file_path in csv_file_paths:
+        npy_file_path = csv_file_path[:-len('.csv')] + '.npy'
+        sample_x, sample_f = load_sample(csv_file_path)
+        save_sample(npy_file_path, sample_x, sample_f)
+
+        if check:
+            npy_x, npy_f = load_sample(npy_file_path)
+            if not (np.array_equal(npy_x, sample_x) and np.array_equal(npy_f, sample_f)):
+                error_msg = "Error: {} does not match {}.".format(npy_file_path, csv_file_path)
+                raise Exception(error_msg)
+
+        if remove_csv:
+            os.remove(csv_file_path)
+        print("Converted: {} -> {}".format(csv_file_path, npy_file_path))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the csv sample files to the .npy format')
+    parser.add_argument('sample_dir_paths', nargs='*', default=['./sample_data/lhs_multiplier50_sid0'])
+    parser.add_argument('--remove_csv', action='store_true', help='Remove each csv file after it has been converted')
+    args = parser.parse_args()
+
+    for sample_dir_path in args.sample_dir_paths:
+        convert_sample_dir(sample_dir_path, remove_csv=args.remove_csv)
@@ -1,9 +1,16 @@
 #!/usr/bin/env python
 import os
 import numpy as np
+import pandas as pd
 import statistics as stat
 
-def avg_accuracy(class_res_dir_path, high_level_label, dim):
+def avg_accuracy(class_res_dir_path, high_level_label, dim, results_df=None):
+    # The consolidated results made by property_classification.py are used if available
+    if results_df is not None:
+        scores = results_df[(results_df['target'] == high_level_label) & (results_df['dim'] == dim)]['accuracy']
+        if len(scores) == 24:
+            return stat.mean(scores.tolist())
+
     scores = []
     
     for fun_id in range(1, 24+1):
@@ -16,10 +23,15 @@ def avg_accuracy(class_res_dir_path, high_level_label, dim):
                         
 if __name__ == '__main__':
     class_res_dir_path = './classification_results/lhs_multiplier50_sid0_basic_ela_distr_pca_limo_ic_disp_nbc_tpca2_ela_level_tpca2_ela_meta_dims3_5_10_20_40_80_160_320_640'
+
+    results_df = None
+    results_file_path = os.path.join(class_res_dir_path, 'accuracy_results.csv')
+    if os.path.exists(results_file_path):
+        results_df = pd.read_csv(results_file_path, header=0)
     
     for high_level_label in ['multimodality', 'globalstructure', 'separability', 'variablescaling', 'homogeneity', 'basinsizes', 'glcontrast']:
         print("-"*60)
         print("High level classification property={}".format(high_level_label))
         for dim in [3, 5, 10, 20, 40, 80, 160, 320, 640]:
-            res = avg_accuracy(class_res_dir_path, high_level_label, dim)
+            res = avg_accuracy(class_res_dir_path, high_level_label, dim, results_df)
             print("Dimension={}, accuracy={}".format(dim, res))
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist, cdist
+from native_features import native_feature_classes, create_native_feature_object, calculate_native_feature_set, fit_lm, check_parity, nearest_better_stats, pairwise_distance_mean_median
+from sample_store import save_sample
+
+def create_sample(n, dim, fun, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-5, 5, (n, dim))
+    return x, fun(x)
+
+def test_basic():
+    x, y = create_sample(150, 3, lambda x: np.sum(x ** 2, axis=1))
+    feature_dict = calculate_native_feature_set(create_native_feature_object(x, y), 'basic')
+    assert feature_dict['basic.dim'] == 3
+    assert feature_dict['basic.observations'] == 150
+    assert feature_dict['basic.lower_min'] == -5 and feature_dict['basic.upper_max'] == 5
+    assert feature_dict['basic.objective_min'] == np.min(y) and feature_dict['basic.objective_max'] == np.max(y)
+    assert feature_dict['basic.cells_total'] == 1 and feature_dict['basic.cells_filled'] == 1
+    assert not feature_dict['basic.allows_cm']
+
+    feature_dict = calculate_native_feature_set(create_native_feature_object(x, y, blocks=3), 'basic')
+    assert feature_dict['basic.cells_total'] == 27
+    assert 1 <= feature_dict['basic.cells_filled'] <= 27
+    assert feature_dict['basic.allows_cm']
+
+def test_ela_meta_linear():
+    x, y = create_sample(150, 3, lambda x: 1 + x @ np.array([1., 2., 4.]))
+    feature_dict = calculate_native_feature_set(create_native_feature_object(x, y), 'ela_meta')
+    assert feature_dict['ela_meta.lin_simple.adj_r2'] == pytest.approx(1)
+    assert feature_dict['ela_meta.lin_simple.intercept'] == pytest.approx(1)
+    assert feature_dict['ela_meta.lin_simple.coef.min'] == pytest.approx(1)
+    assert feature_dict['ela_meta.lin_simple.coef.max'] == pytest.approx(4)
+    assert feature_dict['ela_meta.lin_simple.coef.max_by_min'] == pytest.approx(4)
+
+def test_ela_meta_quadratic():
+    x, y = create_sample(150, 3, lambda x: x ** 2 @ np.array([1., 2., 4.]))
+    feature_dict = calculate_native_feature_set(create_native_feature_object(x, y), 'ela_meta')
+    assert feature_dict['ela_meta.quad_simple.adj_r2'] == pytest.approx(1)
+    assert feature_dict['ela_meta.quad_simple.cond'] == pytest.approx(4)
+    assert feature_dict['ela_meta.quad_w_interact.adj_r2'] == pytest.approx(1)
+
+def test_fit_lm_fewer_points_than_terms():
+    rng = np.random.default_rng(0)
+    coefs, adj_r2 = fit_lm(rng.uniform(size=(3, 5)), rng.uniform(size=3))
+    assert len(coefs) == 6
+    # The first 3 terms interpolate the 3 points, and the others cannot be estimated
+    assert np.all(np.isfinite(coefs[:3])) and np.all(np.isnan(coefs[3:]))
+    assert np.isnan(adj_r2)
+
+def test_fit_lm_dependent_terms():
+    x, y = create_sample(50, 2, lambda x: 1 + x @ np.array([2., 3.]))
+    coefs, adj_r2 = fit_lm(np.hstack([x, 2 * x[:, :1]]), y)
+    assert coefs[:3] == pytest.approx([1, 2, 3])
+    assert np.isnan(coefs[3])
+    assert adj_r2 == pytest.approx(1)
+
+@pytest.mark.parametrize('dim', [3, 5])
+def test_limo_sparse_cells(dim):
+    # Some of the 3^dim cells have fewer points than the coefficients of the linear model
+    x, y = create_sample(50 * dim, dim, lambda x: np.sum(x ** 2, axis=1))
+    feature_dict = calculate_native_feature_set(create_native_feature_object(x, y, blocks=3), 'limo')
+    assert 'limo.length_mean' in feature_dict
+
+def test_ela_meta_small_sample():
+    # The quadratic model with interactions has more terms than points
+    x, y = create_sample(5 * 12, 12, lambda x: np.sum(x ** 2, axis=1))
+    feature_dict = calculate_native_feature_set(create_native_feature_object(x, y), 'ela_meta')
+    assert np.isfinite(feature_dict['ela_meta.lin_simple.adj_r2'])
+    assert np.isnan(feature_dict['ela_meta.quad_w_interact.adj_r2'])
+
+@pytest.mark.parametrize('dim', [3, 5])
+def test_parity(tmp_path, dim):
+    pytest.importorskip('pflacco')
+    sample_data_file_paths = []
+    for seed, fun in enumerate([lambda x: np.sum(x ** 2, axis=1), lambda x: np.sum(np.abs(x), axis=1) + np.sin(3 * x[:, 0])]):
+        x, y = create_sample(50 * dim, dim, fun, seed)
+        sample_data_file_path = str(tmp_path / 'x_f{}_DIM{}.npy'.format(seed, dim))
+        save_sample(sample_data_file_path, x, y)
+        sample_data_file_paths.append(sample_data_file_path)
+    assert check_parity(sample_data_file_paths, native_feature_classes) == 0
+
+def test_cm_conv_sparse_names():
+    # With fewer points than cells, the features over the occupied cells are named differently from those of flacco
+    x, y = create_sample(60, 6, lambda x: np.sum(x ** 2, axis=1))
+    feature_dict = calculate_native_feature_set(create_native_feature_object(x, y, blocks=3), 'cm_conv')
+    assert 'cm_conv.convex.hard' not in feature_dict
+    assert 0 <= feature_dict['cm_conv.occupied.convex.hard'] <= feature_dict['cm_conv.occupied.convex.soft'] <= 1
+
+# A memory budget of 3 rows of the distance matrix per thread forces many chunks
+@pytest.mark.parametrize('n_threads', [1, 3])
+def test_nearest_better_stats_chunked(n_threads):
+    x, y = create_sample(200, 4, lambda x: np.sum(x ** 2, axis=1) + np.sin(5 * x[:, 0]))
+    nn_dists, nb_dists, nb_ids = nearest_better_stats(x, y, memory_budget=3 * 4 * 8 * 200 * n_threads, n_threads=n_threads)
+
+    D = cdist(x, x)
+    np.fill_diagonal(D, np.inf)
+    assert nn_dists == pytest.approx(np.min(D, axis=1))
+    D[y.reshape(1, -1) >= y.reshape(-1, 1)] = np.inf
+    best = np.argmin(y)
+    assert nb_ids[best] == -1 and np.isnan(nb_dists[best])
+    others = np.arange(len(y)) != best
+    assert np.array_equal(nb_ids[others], np.argmin(D, axis=1)[others])
+    assert nb_dists[others] == pytest.approx(np.min(D, axis=1)[others])
+
+# With a memory budget smaller than all the distances and only 8 bins, the median is narrowed down over several histogram passes.
+# The numbers of the distances are odd for 100 points and even for 101 points.
+@pytest.mark.parametrize('n', [100, 101])
+@pytest.mark.parametrize('n_threads', [1, 3])
+def test_pairwise_distance_mean_median_multi_pass(n, n_threads):
+    x, _ = create_sample(n, 3, lambda x: x[:, 0])
+    mean, median = pairwise_distance_mean_median(x, memory_budget=400 * 8, n_threads=n_threads, n_bins=8)
+    assert mean == pytest.approx(np.mean(pdist(x)))
+    assert median == pytest.approx(np.median(pdist(x)))
+
+@pytest.mark.parametrize('n_threads', [1, 3])
+def test_nbc_disp_chunked(n_threads):
+    x, y = create_sample(300, 5, lambda x: np.sum(np.abs(x), axis=1) + np.sin(3 * x[:, 0]))
+    feat_object = create_native_feature_object(x, y)
+    memory_budget = 2 * 4 * 8 * 300 * n_threads
+
+    # The features other than the costs do not depend on the chunks
+    nbc_dict = calculate_native_feature_set(feat_object, 'nbc', memory_budget, n_threads)
+    ref_dict = calculate_native_feature_set(feat_object, 'nbc')
+    assert {key: nbc_dict[key] for key in ref_dict if 'costs_' not in key} == pytest.approx({key: value for key, value in ref_dict.items() if 'costs_' not in key})
+
+    disp_dict = calculate_native_feature_set(feat_object, 'disp', memory_budget, n_threads)
+    dists = pdist(x)
+    for q in [0.02, 0.05, 0.1, 0.25]:
+        dists_q = pdist(x[y <= np.quantile(y, q)])
+        name = '{:02d}'.format(int(round(100 * q)))
+        assert disp_dict['disp.ratio_mean_' + name] == pytest.approx(np.mean(dists_q) / np.mean(dists))
+        assert disp_dict['disp.ratio_median_' + name] == pytest.approx(np.median(dists_q) / np.median(dists))
+        assert disp_dict['disp.diff_mean_' + name] == pytest.approx(np.mean(dists_q) - np.mean(dists))
+        assert disp_dict['disp.diff_median_' + name] == pytest.approx(np.median(dists_q) - np.median(dists))
@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import pytest
+from sample_store import get_sample_data_file_path, save_sample, save_sample_chunks, load_sample, convert_sample_dir
+
+def create_sample(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-5, 5, (n, dim))
+    # Values that are not exactly representable in a short decimal form
+    return x, np.sum(x ** 2, axis=1) / 3.
+
+def split_chunks(x, f, chunk_size):
+    for start in range(0, len(f), chunk_size):
+        yield x[start:start + chunk_size], f[start:start + chunk_size]
+
+@pytest.mark.parametrize('sample_format', ['npy', 'csv'])
+def test_round_trip(tmp_path, sample_format):
+    x, f = create_sample(50, 3)
+    sample_data_file_path = get_sample_data_file_path(str(tmp_path), 'bbob', 1, 3, 1, sample_format)
+    save_sample(sample_data_file_path, x, f)
+    assert not os.path.exists(sample_data_file_path + '.tmp')
+
+    loaded_x, loaded_f = load_sample(sample_data_file_path)
+    assert np.array_equal(loaded_x, x) and np.array_equal(loaded_f, f)
+
+def test_npy_mmap(tmp_path):
+    x, f = create_sample(50, 3)
+    sample_data_file_path = str(tmp_path / 'x.npy')
+    save_sample(sample_data_file_path, x, f)
+
+    loaded_x, loaded_f = load_sample(sample_data_file_path)
+    assert isinstance(loaded_x.base, np.memmap) and not loaded_x.flags.writeable
+    loaded_x, loaded_f = load_sample(sample_data_file_path, mmap=False)
+    assert not isinstance(loaded_x.base, np.memmap) and np.array_equal(loaded_x, x)
+
+def test_single_point(tmp_path):
+    x, f = create_sample(1, 3)
+    for sample_format in ['npy', 'csv']:
+        sample_data_file_path = str(tmp_path / 'x.{}'.format(sample_format))
+        save_sample(sample_data_file_path, x, f)
+        loaded_x, loaded_f = load_sample(sample_data_file_path)
+        assert loaded_x.shape == (1, 3) and np.array_equal(loaded_x, x) and np.array_equal(loaded_f, f)
+
+# The last chunk is smaller than the others
+@pytest.mark.parametrize('sample_format', ['npy', 'csv'])
+def test_save_sample_chunks(tmp_path, sample_format):
+    x, f = create_sample(53, 4)
+    chunked_file_path = str(tmp_path / 'chunked.{}'.format(sample_format))
+    save_sample_chunks(chunked_file_path, len(f), 4, split_chunks(x, f, 10))
+    assert not os.path.exists(chunked_file_path + '.tmp')
+
+    loaded_x, loaded_f = load_sample(chunked_file_path)
+    assert np.array_equal(loaded_x, x) and np.array_equal(loaded_f, f)
+
+    # The file is the same as the one written at once
+    file_path = str(tmp_path / 'x.{}'.format(sample_format))
+    save_sample(file_path, x, f)
+    with open(chunked_file_path, 'rb') as fh1, open(file_path, 'rb') as fh2:
+        assert fh1.read() == fh2.read()
+
+def test_save_sample_chunks_wrong_size(tmp_path):
+    x, f = create_sample(53, 4)
+    sample_data_file_path = str(tmp_path / 'x.npy')
+    with pytest.raises(Exception, match='sample size'):
+        save_sample_chunks(sample_data_file_path, 60, 4, split_chunks(x, f, 10))
+    assert not os.path.exists(sample_data_file_path) and not os.path.exists(sample_data_file_path + '.tmp')
+
+@pytest.mark.parametrize('remove_csv', [False, True])
+def test_convert_sample_dir(tmp_path, remove_csv):
+    samples = {}
+    for fun_id in [1, 2]:
+        x, f = create_sample(20, 2, seed=fun_id)
+        csv_file_path = get_sample_data_file_path(str(tmp_path), 'bbob', fun_id, 2, 1, 'csv')
+        save_sample(csv_file_path, x, f)
+        samples[fun_id] = (x, f)
+
+    convert_sample_dir(str(tmp_path), remove_csv=remove_csv)
+    for fun_id, (x, f) in samples.items():
+        loaded_x, loaded_f = load_sample(get_sample_data_file_path(str(tmp_path), 'bbob', fun_id, 2, 1, 'npy'))
+        assert np.array_equal(loaded_x, x) and np.array_equal(loaded_f, f)
+        assert os.path.exists(get_sample_data_file_path(str(tmp_path), 'bbob', fun_id, 2, 1, 'csv')) != remove_csv
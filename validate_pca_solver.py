@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+import numpy as np
+import argparse
+import time
+from pflacco.pflacco import calculate_feature_set
+from sample_store import get_sample_data_file_path, load_sample
+from feature_computation import get_bbob_suite, reduce_dim, select_pca_solver, create_bbob_feature_object
+
+# Align the sign of each column of Y with that of Y_ref, since the principal components are unique only up to sign
+def align_signs(Y, Y_ref):
+    signs = np.sign(np.sum(Y * Y_ref, axis=0))
+    signs[signs == 0] = 1
+    return Y * signs
+
+# Compare the projected coordinates and the 'tpca' features obtained by each PCA solver with those by the full SVD
+def validate_pca_solver(sample_data_file_path, n_pca_components, pca_solvers, ela_feature_classes):
+    sample_x, sample_f = load_sample(sample_data_file_path)
+    results = []
+
+    start_time = time.time()
+    Y_ref = reduce_dim(sample_x, sample_f, n_pca_components, 'full')
+    ref_time = time.time() - start_time
+    ref_feat_object = create_bbob_feature_object(Y_ref, sample_f, 'pca', False)
+    ref_feature_dicts = {ela_feature_class: calculate_feature_set(ref_feat_object, ela_feature_class) for ela_feature_class in ela_feature_classes}
+
+    for pca_solver in pca_solvers:
+        start_time = time.time()
+        Y = reduce_dim(sample_x, sample_f, n_pca_components, pca_solver)
+        solver_time = time.time() - start_time
+        Y = align_signs(Y, Y_ref)
+        max_coord_error = np.max(np.abs(Y - Y_ref)) / np.max(np.abs(Y_ref))
+
+        # The features are computed from the original output of the solver, not from the sign-aligned one
+        feat_object = create_bbob_feature_object(reduce_dim(sample_x, sample_f, n_pca_components, pca_solver), sample_f, 'pca', False)
+        max_feature_error = 0
+        for ela_feature_class in ela_feature_classes:
+            feature_dict = calculate_feature_set(feat_object, ela_feature_class)
+            for key, ref_value in ref_feature_dicts[ela_feature_class].items():
+                # The runtime is not a feature
+                if 'costs_runtime' in key:
+                    continue
+                value = feature_dict[key]
+                if np.isfinite(ref_value) and np.isfinite(value):
+                    max_feature_error = max(max_feature_error, abs(value - ref_value) / max(abs(ref_value), 1.))
+
+        results.append((pca_solver, solver_time, ref_time, max_coord_error, max_feature_error))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validate the PCA solvers against the full SVD')
+    parser.add_argument('--sample_dir_path', default='./sample_data/lhs_multiplier50_sid0')
+    parser.add_argument('--dims', type=int, nargs='+', default=[10, 20, 40, 80, 160, 320, 640])
+    parser.add_argument('--fun_ids', type=int, nargs='+', default=list(range(1, 24+1)))
+    parser.add_argument('--instance_ids', type=int, nargs='+', default=[1])
+    parser.add_argument('--n_pca_components', type=int, default=2)
+    parser.add_argument('--report_file_path', default='./pca_solver_report.csv')
+    args = parser.parse_args()
+
+    pca_solvers = ['randomized', 'arpack', 'eigh']
+    ela_feature_classes = ['ela_level', 'ela_meta']
+
+    with open(args.report_file_path, 'w') as fh:
+        fh.write('dim,fun,instance,auto_solver,pca_solver,solver_time,full_time,max_coord_error,max_feature_error\n')
+        for dim in args.dims:
+            bbob_suite = get_bbob_suite(dim)
+            for fun_id in args.fun_ids:
+                for instance_id in args.instance_ids:
+                    sample_data_file_path = get_sample_data_file_path(args.sample_dir_path, bbob_suite, fun_id, dim, instance_id)
+                    sample_x, sample_f = load_sample(sample_data_file_path)
+                    auto_solver = select_pca_solver(len(sample_x), dim, args.n_pca_components)
+                    results = validate_pca_solver(sample_data_file_path, args.n_pca_components, pca_solvers, ela_feature_classes)
+                    for pca_solver, solver_time, ref_time, max_coord_error, max_feature_error in results:
+                        fh.write('{},{},{},{},{},{},{},{},{}\n'.format(dim, fun_id, instance_id, auto_solver, pca_solver, solver_time, ref_time, max_coord_error, max_feature_error))
+                        print("dimension={}, f={}, instance ID={}, solver={}: time={:.3f}s (full: {:.3f}s), max. coordinate error={:.2e}, max. feature error={:.2e}".format(dim, fun_id, instance_id, pca_solver, solver_time, ref_time, max_coord_error, max_feature_error))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import multiprocessing
+import multiprocessing.connection
+import traceback
+import time
+
+# A pool of long-lived worker processes for tasks that need a warm state, e.g., R and flacco loaded through rpy2.
+# Unlike multiprocessing.Pool, (1) a task running longer than "timeout" seconds is aborted by terminating its worker, (2) each worker is replaced by a new one after "max_tasks_per_worker" tasks to cap the growth of its heap (e.g., the heap of R), and (3) a task that raises an exception or kills its worker is reported as a failure instead of aborting the run.
+# Each worker communicates with the parent process through its own pipe, so terminating a worker does not affect the others.
+
+def worker_loop(fun, conn):
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        try:
+            conn.send(('done', fun(task)))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+    conn.close()
+
+def start_worker(fun):
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=worker_loop, args=(fun, child_conn), daemon=True)
+    process.start()
+    child_conn.close()
+    return {'process': process, 'conn': parent_conn, 'task': None, 'start_time': None, 'n_done': 0}
+
+def stop_worker(worker, kill=False):
+    if not kill:
+        try:
+            worker['conn'].send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        worker['process'].join(timeout=10)
+    if worker['process'].is_alive():
+        worker['process'].terminate()
+        worker['process'].join(timeout=5)
+    if worker['process'].is_alive():
+        worker['process'].kill()
+        worker['process'].join()
+    worker['conn'].close()
+
+# Run "fun" for each task by "n_workers" workers. For each task, this generator yields (task, 'done', the return value of fun) or (task, 'error', the reason of the failure), in the order of completion.
+def run_in_pool(fun, tasks, n_workers=1, timeout=None, max_tasks_per_worker=None, poll_interval=1.):
+    pending = list(reversed(tasks))
+    workers = [start_worker(fun) for _ in range(min(n_workers, len(tasks)))]
+    n_remaining = len(tasks)
+
+    try:
+        while n_remaining > 0:
+            # Send a task to each idle worker. A worker that has done "max_tasks_per_worker" tasks is replaced by a new one before that.
+            for i in range(len(workers)):
+                if workers[i]['task'] is None and len(pending) > 0:
+                    if max_tasks_per_worker is not None and workers[i]['n_done'] >= max_tasks_per_worker:
+                        stop_worker(workers[i])
+                        workers[i] = start_worker(fun)
+                    workers[i]['task'] = pending.pop()
+                    workers[i]['start_time'] = time.time()
+                    workers[i]['conn'].send(workers[i]['task'])
+
+            busy_workers = [worker for worker in workers if worker['task'] is not None]
+            ready_conns = multiprocessing.connection.wait([worker['conn'] for worker in busy_workers], timeout=poll_interval)
+
+            for i in range(len(workers)):
+                worker = workers[i]
+                if worker['task'] is None:
+                    continue
+
+                status, value, broken = None, None, False
+                if worker['conn'] in ready_conns:
+                    try:
+                        status, value = worker['conn'].recv()
+                    except (EOFError, OSError):
+                        worker['process'].join(timeout=1)
+                        status, value, broken = 'error', 'The worker died with the exit code {}'.format(worker['process'].exitcode), True
+                elif timeout is not None and time.time() - worker['start_time'] > timeout:
+                    status, value, broken = 'error', 'Timeout after {}s'.format(timeout), True
+                elif not worker['process'].is_alive():
+                    status, value, broken = 'error', 'The worker died with the exit code {}'.format(worker['process'].exitcode), True
+                if status is None:
+                    continue
+
+                task = worker['task']
+                worker['task'] = None
+                worker['n_done'] += 1
+                n_remaining -= 1
+                if broken:
+                    # The worker is in an unknown state, so it is replaced by a new one
+                    stop_worker(worker, kill=True)
+                    if len(pending) > 0:
+                        workers[i] = start_worker(fun)
+                yield task, status, value
+    finally:
+        for worker in workers:
+            if worker['process'].exitcode is None:
+                stop_worker(worker, kill=worker['task'] is not None)
+
+# The same as run_in_pool, but the tasks are run in this process one by one, without timeouts
+def run_sequentially(fun, tasks):
+    for task in tasks:
+        try:
+            yield task, 'done', fun(task)
+        except Exception:
+            yield task, 'error', traceback.format_exc()